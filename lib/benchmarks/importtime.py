@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Check the import time of CLI commands against a budget.
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --budget 30 --repeat 10
+    python benchmarks/importtime.py --no-budget
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+lib = os.path.dirname(here)
+
+# The module each command imports before it runs
+commands = {
+    "version": "container_discovery.client",
+    "update-counts": "container_discovery.client.count",
+    "update-cache": "container_discovery.client.cache",
+}
+
+# Commands that must start fast, and modules they must not import
+budgeted = ["version", "update-counts"]
+heavy = [
+    "requests",
+    "urllib3",
+    "container_guts",
+    "pipelib",
+    "concurrent",
+    "multiprocessing",
+    "sqlite3",
+]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=25,
+        help="Milliseconds allowed to import a budgeted command (median)",
+    )
+    parser.add_argument(
+        "--no-budget",
+        dest="no_budget",
+        action="store_true",
+        default=False,
+        help="Only check that budgeted commands import nothing heavy",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each command")
+    return parser
+
+
+def run(code, importtime=False):
+    """
+    Run code in a fresh interpreter, returning (seconds, stderr).
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    env = dict(os.environ, PYTHONPATH=lib)
+    start = time.perf_counter()
+    result = subprocess.run(
+        command + ["-c", code], env=env, stderr=subprocess.PIPE, text=True, check=True
+    )
+    return time.perf_counter() - start, result.stderr
+
+
+def parse_importtime(stderr, module):
+    """
+    Parse -X importtime output into (microseconds, modules) for a module.
+
+    Modules imported by the module are the lines before it, back to the last
+    top level import (e.g., from site).
+    """
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        lines.append((depth, int(cumulative), name.strip()))
+
+    for index, (depth, cumulative, name) in enumerate(lines):
+        if depth == 0 and name == module:
+            modules = [name]
+            for child in reversed(lines[:index]):
+                if child[0] == 0:
+                    break
+                modules.append(child[2])
+            return cumulative, modules
+    raise ValueError(f"{module} was not found in -X importtime output")
+
+
+def measure(module, repeat):
+    """
+    Measure the import time of a module, and the modules it imports.
+    """
+    imports = []
+    walls = []
+    modules = set()
+    for _ in range(repeat):
+        _, stderr = run(f"import {module}", importtime=True)
+        cumulative, names = parse_importtime(stderr, module)
+        imports.append(cumulative / 1000)
+        modules.update(names)
+        walls.append(run(f"import {module}")[0] * 1000)
+    return statistics.median(imports), statistics.median(walls), modules
+
+
+def main():
+    args = get_parser().parse_args()
+    interpreter = statistics.median([run("pass")[0] * 1000 for _ in range(args.repeat)])
+    print(f"{'interpreter':<16} {'':>10} {interpreter:>10.1f}ms")
+
+    failed = []
+    for command, module in commands.items():
+        imported, wall, modules = measure(module, args.repeat)
+        print(f"{command:<16} {imported:>8.1f}ms {wall:>10.1f}ms")
+        if command not in budgeted:
+            continue
+        loaded = sorted(x for x in modules if x.split(".")[0] in heavy and "." not in x)
+        if loaded:
+            failed.append(f"{command} imports {', '.join(loaded)}")
+        if not args.no_budget and imported > args.budget:
+            failed.append(f"{command} takes {imported:.1f}ms (budget {args.budget}ms)")
+
+    for message in failed:
+        print(message)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
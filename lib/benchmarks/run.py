@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+
+# Benchmark the hot paths of container-discovery on synthetic data.
+#
+#   python benchmarks/run.py --output results.json
+#   python benchmarks/run.py --compare results.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+import container_discovery.cache as cache  # noqa
+import container_discovery.filters as filters  # noqa
+import container_discovery.metrics as metrics  # noqa
+import container_discovery.pipelines as pipelines  # noqa
+import container_discovery.registry as registry  # noqa
+import container_discovery.tags as tags  # noqa
+import container_discovery.utils as utils  # noqa
+import stubs  # noqa
+import synthetic  # noqa
+
+
+def timeit(func, repeat=5, number=1):
+    """
+    Time a function, returning seconds for each of repeat runs (of number calls).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Silence output from the library (it prints a line per image).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_counts(root, args):
+    results = {}
+    for workers in sorted({1, args.workers}):
+        with quiet():
+            results[f"workers={workers}"] = timeit(
+                lambda: metrics.get_total_counts(root, workers=workers), args.repeat
+            )
+    return results
+
+
+def bench_recursive_find(root, args):
+    return timeit(lambda: list(utils.recursive_find(root, ".json")), args.repeat)
+
+
+def bench_find_files(root, args):
+    return timeit(lambda: list(utils.find_files(root, ".json")), args.repeat)
+
+
+def bench_filter_aliases(root, args):
+    counts = metrics.get_total_counts(root)
+    entries = [
+        cache.CacheEntry(x, root, counts).load()
+        for x in utils.recursive_find(root, ".json")
+    ]
+
+    def run():
+        for entry in entries:
+            entry.filter_aliases()
+
+    return timeit(run, args.repeat)
+
+
+def bench_filter_aliases_large(args):
+    """
+    Time filter_aliases for entries with many aliases (e.g., 10k each).
+    """
+    root = tempfile.mkdtemp(prefix="benchmark-large-")
+    try:
+        synthetic.generate_cache(
+            root,
+            args.large_images,
+            args.large_aliases,
+            args.large_aliases * 2,
+            uniform=True,
+        )
+        return bench_filter_aliases(root, args)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_include_path(args):
+    paths = synthetic.generate_paths(args.images * args.aliases, args.vocabulary)
+
+    def run():
+        filters.path_filter.include.cache_clear()
+        for path in paths:
+            filters.include_path(path)
+
+    return timeit(run, args.repeat)
+
+
+def bench_cache_prefix(args):
+    listing = synthetic.generate_listing(args.images)
+    options = cache.Options()
+    options.add_option("root", "/tmp/cache")
+    for prefix in ["org_prefix", "registry_prefix", "repo_prefix"]:
+        options.add_option(prefix, prefix == "repo_prefix")
+
+    def run():
+        for image in listing:
+            cache.get_cache_prefix(image, options)
+
+    return timeit(run, args.repeat)
+
+
+def bench_tags_pipeline(args):
+    listings = [synthetic.generate_tags(args.tags, seed=i) for i in range(200)]
+    p = pipelines.get_tags_pipeline()
+
+    def run():
+        for listing in listings:
+            p.run(list(listing), unwrap=False)
+
+    return timeit(run, args.repeat)
+
+
+def bench_select_tag(args):
+    listings = [synthetic.generate_tags(args.tags, seed=i) for i in range(200)]
+
+    def run():
+        pipelines.tag_selector.memo.clear()
+        for listing in listings:
+            pipelines.select_tag(listing)
+
+    return timeit(run, args.repeat)
+
+
+def bench_list_tags(args):
+    """
+    Time listing tags with the crane stub, and from a registry stub (v2 API).
+    """
+    crane = stubs.CraneStub(latency=args.tags_latency, tags=args.tags).start()
+    stub = stubs.RegistryStub(latency=args.tags_latency, tags=args.tags).start()
+    listing = synthetic.generate_listing(args.update_images)
+    names = [x.split("/", 1)[-1] for x in listing]
+    results = {}
+    try:
+        for workers in sorted({1, args.workers}):
+            client = registry.RegistryClient(
+                workers=workers, tag_registries=[stub.registry]
+            )
+            for name, url, images in [
+                ("crane", crane.url, names),
+                ("registry", None, [f"{stub.registry}/{x}" for x in names]),
+            ]:
+                start = time.perf_counter()
+                with quiet():
+                    for _ in tags.iter_tags(images, workers, url=url, client=client):
+                        pass
+                results[f"{name}.workers={workers}"] = {
+                    "seconds": time.perf_counter() - start,
+                    "images": len(images),
+                }
+    finally:
+        crane.stop()
+        stub.stop()
+    return results
+
+
+def bench_update(args):
+    """
+    Time update end to end, with the crane stub and fake guts (offline).
+    """
+    stub = stubs.CraneStub(latency=args.tags_latency, tags=args.tags).start()
+    stubs.fake_guts(latency=args.guts_latency, aliases=args.aliases)
+    listing = synthetic.generate_listing(args.update_images)
+    results = {}
+    try:
+        for workers in sorted({1, args.workers}):
+            root = tempfile.mkdtemp(prefix="benchmark-update-")
+            start = time.perf_counter()
+            with quiet():
+                options = cache.RunOptions(
+                    tags_url=stub.url, tag_workers=workers, guts_workers=workers
+                )
+                cache.update(listing, root, no_cleanup=True, options=options)
+            results[f"workers={workers}"] = {
+                "seconds": time.perf_counter() - start,
+                "images": len(listing),
+            }
+            shutil.rmtree(root, ignore_errors=True)
+    finally:
+        stub.stop()
+    return results
+
+
+def get_commit():
+    """
+    Get the commit of the repository, if we can.
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=here, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=""):
+    """
+    Flatten nested results to {name: seconds} for comparison.
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if "median" in value:
+            flat[name] = value["median"]
+        elif "seconds" in value:
+            flat[name] = value["seconds"]
+        else:
+            flat.update(flatten(value, f"{name}."))
+    return flat
+
+
+def compare(results, filename):
+    """
+    Print the ratio of each benchmark to a previous result (below 1 is faster).
+    """
+    previous = flatten(utils.read_json(filename)["benchmarks"])
+    for name, seconds in flatten(results["benchmarks"]).items():
+        if name not in previous:
+            continue
+        ratio = seconds / previous[name]
+        print(f"{name:40} {previous[name]:10.4f}s {seconds:10.4f}s {ratio:6.2f}x")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Benchmark container-discovery.")
+    parser.add_argument("--output", help="Write results to this json file")
+    parser.add_argument("--compare", help="Compare results to a previous json file")
+    parser.add_argument("--images", type=int, default=2000, help="Images in the cache")
+    parser.add_argument("--aliases", type=int, default=20, help="Aliases per image")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="Unique aliases")
+    parser.add_argument(
+        "--prefix",
+        choices=["org", "registry", "repo"],
+        help="Letter prefix layout for the cache",
+    )
+    parser.add_argument(
+        "--large-aliases",
+        type=int,
+        default=10000,
+        help="Aliases per entry for filter_aliases on large entries",
+    )
+    parser.add_argument(
+        "--large-images", type=int, default=50, help="Entries with large aliases"
+    )
+    parser.add_argument("--tags", type=int, default=50, help="Tags per listing")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="Workers to compare")
+    parser.add_argument(
+        "--update-images", type=int, default=50, help="Images for update end to end"
+    )
+    parser.add_argument("--tags-latency", type=float, default=0.05)
+    parser.add_argument("--guts-latency", type=float, default=0.1)
+    parser.add_argument(
+        "--skip-update", action="store_true", help="Don't time update end to end"
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    root = tempfile.mkdtemp(prefix="benchmark-cache-")
+    try:
+        synthetic.generate_cache(
+            root, args.images, args.aliases, args.vocabulary, prefix=args.prefix
+        )
+        benchmarks = {
+            "get_total_counts": bench_counts(root, args),
+            "recursive_find": bench_recursive_find(root, args),
+            "find_files": bench_find_files(root, args),
+            "filter_aliases": bench_filter_aliases(root, args),
+            "filter_aliases_large": bench_filter_aliases_large(args),
+            "include_path": bench_include_path(args),
+            "get_cache_prefix": bench_cache_prefix(args),
+            "tags_pipeline": bench_tags_pipeline(args),
+            "select_tag": bench_select_tag(args),
+            "list_tags": bench_list_tags(args),
+        }
+        if not args.skip_update:
+            benchmarks["update"] = bench_update(args)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        "commit": get_commit(),
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "benchmarks": benchmarks,
+    }
+    print(json.dumps(results, indent=4))
+    if args.output:
+        utils.write_json(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import container_discovery.guts as guts
+import synthetic
+
+
+class CraneHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve synthetic tag listings at /ls/<image>, like crane.ggcr.dev
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+        image = self.path.split("/ls/", 1)[-1]
+        seed = sum(image.encode("utf-8"))
+        body = "\n".join(synthetic.generate_tags(server.tags, seed)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CraneStub:
+    """
+    A local stand-in for the crane endpoint, with a simulated latency.
+    """
+
+    def __init__(self, latency=0.05, tags=50):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CraneHandler)
+        self.server.latency = latency
+        self.server.tags = tags
+        self.server.requests = 0
+        self.server.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/ls/{{image}}"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RegistryHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve synthetic tag listings at /v2/<name>/tags/list, like a registry.
+
+    Listings are paged (with n and last, and a Link to the next page), and a
+    bearer token from /token is required, as for anonymous pulls. A name with
+    a status (e.g., 404 or 503) is answered with it instead.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        with server.lock:
+            server.requests += 1
+            if url.path == "/token":
+                server.tokens += 1
+
+        if url.path == "/token":
+            token = {"token": "stub", "expires_in": server.expires_in}
+            return self.send(200, json.dumps(token).encode("utf-8"))
+
+        if self.headers.get("Authorization") != "Bearer stub":
+            realm = f"http://{self.headers['Host']}/token"
+            challenge = f'Bearer realm="{realm}",service="stub"'
+            return self.send(401, headers={"WWW-Authenticate": challenge})
+
+        name = url.path[len("/v2/") : -len("/tags/list")]
+        if name in server.statuses:
+            return self.send(server.statuses[name])
+        seed = sum(name.encode("utf-8"))
+        tags = list(dict.fromkeys(synthetic.generate_tags(server.tags, seed)))
+
+        # A page of tags after the last, and a link to the next
+        start = tags.index(query["last"]) + 1 if "last" in query else 0
+        size = int(query.get("n", server.page_size))
+        page = tags[start : start + size]
+        headers = {}
+        if start + size < len(tags):
+            params = urllib.parse.urlencode({"n": size, "last": page[-1]})
+            headers["Link"] = f'<{url.path}?{params}>; rel="next"'
+        body = json.dumps({"name": name, "tags": page}).encode("utf-8")
+        self.send(200, body, headers)
+
+    def send(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RegistryStub:
+    """
+    A local stand-in for a registry's tag listing, with a simulated latency.
+
+    Statuses map repository names to the error status they are answered with.
+    """
+
+    def __init__(
+        self, latency=0.05, tags=50, page_size=100, expires_in=300, statuses=None
+    ):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RegistryHandler)
+        self.server.latency = latency
+        self.server.tags = tags
+        self.server.page_size = page_size
+        self.server.expires_in = expires_in
+        self.server.statuses = statuses or {}
+        self.server.requests = 0
+        self.server.tokens = 0
+        self.server.lock = threading.Lock()
+
+    @property
+    def registry(self):
+        return f"127.0.0.1:{self.server.server_port}"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    @property
+    def tokens(self):
+        return self.server.tokens
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_guts(latency=0.1, aliases=20, vocabulary=5000):
+    """
+    Replace guts generation (and pulls) with synthetic aliases and a latency.
+
+    The replacement is made on the module, so it is inherited by guts workers
+    that are forked.
+    """
+
+    def generate_aliases(container):
+        time.sleep(latency)
+        rng = random.Random(container)
+        return synthetic.get_aliases(rng, vocabulary, aliases)
+
+    guts.generate_aliases = generate_aliases
+    guts.pull_image = lambda container: 0
@@ -0,0 +1,128 @@
+import json
+import os
+import random
+
+# Directories and extensions for synthetic paths, including some to filter out
+bin_dirs = ["/usr/local/bin", "/opt/conda/bin", "/usr/bin", "/usr/local/sbin", "/bin"]
+endings = ["", "", "", "", ".py", ".pl", ".sh", ".so", ".md", ".debug"]
+
+
+def get_aliases(rng, vocabulary, count):
+    """
+    Get a dict of synthetic aliases (name to path) drawn from a vocabulary.
+
+    Names are drawn with a skew (like real executables) so a few are common
+    to most images, and most are rare.
+    """
+    aliases = {}
+    while len(aliases) < min(count, vocabulary):
+        i = int(rng.paretovariate(1.2)) % vocabulary
+        name = f"tool{i}{endings[i % len(endings)]}"
+        aliases[name] = os.path.join(bin_dirs[i % len(bin_dirs)], name)
+    return aliases
+
+
+def sample_aliases(rng, vocabulary, count):
+    """
+    Get a dict of synthetic aliases drawn uniformly from a vocabulary.
+
+    A skewed draw rarely reaches the rare names, so large entries (e.g., 10k
+    aliases) are sampled uniformly instead.
+    """
+    aliases = {}
+    for i in rng.sample(range(vocabulary), min(count, vocabulary)):
+        name = f"tool{i}{endings[i % len(endings)]}"
+        aliases[name] = os.path.join(bin_dirs[i % len(bin_dirs)], name)
+    return aliases
+
+
+def get_image(i, namespace="quay.io/biocontainers"):
+    """
+    Get the name of the ith synthetic image.
+    """
+    return f"{namespace}/image{i}"
+
+
+def get_cache_path(root, image, tag, prefix=None):
+    """
+    Get the path for an entry, with the same letter prefix layout as update.
+    """
+    registry, namespace, repo = image.split("/")
+    if prefix == "org":
+        parts = [registry, namespace[0], namespace, repo]
+    elif prefix == "registry":
+        parts = [registry[0], registry, namespace, repo]
+    elif prefix == "repo":
+        parts = [registry, namespace, repo[0], repo]
+    else:
+        parts = [registry, namespace, repo]
+    return os.path.join(root, *parts) + f":{tag}.json"
+
+
+def generate_cache(
+    root,
+    images=1000,
+    aliases=20,
+    vocabulary=5000,
+    prefix=None,
+    namespace="quay.io/biocontainers",
+    seed=0,
+    uniform=False,
+):
+    """
+    Generate a synthetic cache tree, and return the paths of the entries.
+
+    Each image has one entry with a number of aliases, in the layout for a
+    letter prefix (org, registry, repo) or the default layout. Aliases are
+    drawn with a skew, or uniformly (for large entries).
+    """
+    draw = sample_aliases if uniform else get_aliases
+    rng = random.Random(seed)
+    paths = []
+    for i in range(images):
+        image = get_image(i, namespace)
+        path = get_cache_path(root, image, "1.0.0--h1_0", prefix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fd:
+            json.dump(draw(rng, vocabulary, aliases), fd, indent=4)
+        paths.append(path)
+    return paths
+
+
+def generate_tags(count=50, seed=0):
+    """
+    Generate a synthetic listing of tags, mixing versions, conda builds and names.
+    """
+    rng = random.Random(seed)
+    tags = []
+    for _ in range(count):
+        major, minor, patch = rng.randint(0, 3), rng.randint(0, 20), rng.randint(0, 9)
+        kind = rng.random()
+        if kind < 0.5:
+            build = f"h{rng.randint(1, 9999)}_{rng.randint(0, 3)}"
+            tags.append(f"{major}.{minor}.{patch}--{build}")
+        elif kind < 0.8:
+            tags.append(f"{major}.{minor}.{patch}")
+        elif kind < 0.9:
+            tags.append(f"{major}.{minor}")
+        else:
+            tags.append(rng.choice(["latest", "main", "dev", "stable"]))
+    return tags
+
+
+def generate_listing(images=1000, namespace="quay.io/biocontainers"):
+    """
+    Generate a listing of containers (as in containers.txt).
+    """
+    return [get_image(i, namespace) for i in range(images)]
+
+
+def generate_paths(count=10000, vocabulary=5000, seed=0):
+    """
+    Generate paths (with repeats, as across images) to filter.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        paths.extend(get_aliases(rng, vocabulary, 1).values())
+    return paths
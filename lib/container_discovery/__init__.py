@@ -1,3 +1,3 @@
-from pipelib.version import __version__
+from .version import __version__
 
 assert __version__
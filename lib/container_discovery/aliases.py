@@ -0,0 +1,121 @@
+import mmap
+import os
+import struct
+
+import container_discovery.metrics as metrics
+
+# An alias index file starts with this, and then the number of records
+magic = b"CDALIAS1"
+header = struct.Struct("<8sQ")
+offset = struct.Struct("<Q")
+
+
+class AliasIndex:
+    """
+    A reverse index from an alias (executable name) to containers that provide it.
+
+    The index is a sorted string table: a header, a table of record offsets,
+    and records (alias, container, path) sorted by alias. It is memory mapped
+    and searched with a binary search, so a query reads a few pages.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as fd:
+            self.data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        found, self.count = header.unpack_from(self.data, 0)
+        if found != magic:
+            raise ValueError(f"{filename} is not an alias index.")
+
+    def get_offset(self, i):
+        """
+        Get the offset of the ith record.
+        """
+        return offset.unpack_from(self.data, header.size + i * offset.size)[0]
+
+    def get_alias(self, i):
+        """
+        Get the alias of the ith record.
+        """
+        start = self.get_offset(i)
+        return self.data[start : self.data.find(b"\t", start)]
+
+    def get_record(self, i):
+        """
+        Get the ith record, as a dictionary.
+        """
+        start = self.get_offset(i)
+        record = self.data[start : self.data.find(b"\n", start)].decode("utf-8")
+        alias, container, path = record.split("\t")
+        return {"alias": alias, "container": container, "path": path}
+
+    def query(self, alias):
+        """
+        Find the containers (and path) that provide an alias.
+        """
+        key = alias.encode("utf-8")
+
+        # Find the first record for the alias
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_alias(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        results = []
+        while lo < self.count and self.get_alias(lo) == key:
+            results.append(self.get_record(lo))
+            lo += 1
+        return results
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+
+
+def write_index(records, filename):
+    """
+    Write (alias, container, path) records to an alias index file.
+
+    Fields are separated by tabs (and records by newlines), so records with
+    either in a field cannot be indexed, and are skipped with a warning.
+    """
+    lines = []
+    skipped = 0
+    for record in records:
+        if any("\t" in x or "\n" in x for x in record):
+            print(f"Warning, skipping alias with a tab or newline: {record!r}")
+            skipped += 1
+            continue
+        lines.append("\t".join(record).encode("utf-8") + b"\n")
+    lines.sort()
+    if skipped:
+        print(f"Warning, skipped {skipped} aliases that cannot be indexed.")
+
+    # Records start after the header and the table of offsets
+    start = header.size + len(lines) * offset.size
+    tmpfile = f"{filename}.tmp"
+    with open(tmpfile, "wb") as fd:
+        fd.write(header.pack(magic, len(lines)))
+        for line in lines:
+            fd.write(offset.pack(start))
+            start += len(line)
+        for line in lines:
+            fd.write(line)
+    os.replace(tmpfile, filename)
+    return len(lines)
+
+
+def build_index(root, filename, workers=1, pack=None):
+    """
+    Build an alias index for a cache, returning the counts from the same pass.
+    """
+    records = []
+    counts = metrics.get_total_counts(root, workers=workers, pack=pack, records=records)
+    count = write_index(records, filename)
+    print(f"Wrote {count} aliases to {filename}")
+    return counts
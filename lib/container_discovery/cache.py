@@ -1,14 +1,29 @@
+import collections
+import functools
 import glob
+import heapq
 import os
 import re
 import shutil
 import sys
+import time
 
+import container_discovery.checkpoint as checkpoints
+import container_discovery.defaults as defaults
+import container_discovery.digests as digestmap
 import container_discovery.filters as filters
+import container_discovery.guts as guts
+import container_discovery.images as budgets
+import container_discovery.layers as layers
+import container_discovery.pipelines as pipelines
+import container_discovery.registry as registry
+import container_discovery.report as reports
+import container_discovery.shards as shards
+import container_discovery.skips as skiplist
+import container_discovery.stages as stages
+import container_discovery.store as store
+import container_discovery.tags as tags
 import container_discovery.utils as utils
-import requests
-from container_discovery.pipelines import tags_pipeline as p
-from container_guts.main import ManifestGenerator
 
 
 def get_cache_entry(image, args, tag):
@@ -24,6 +39,9 @@ def has_cache_entry(image, args):
     Determine if a cache entry exists for any tag.
     """
     cache_path = get_cache_prefix(image, args)
+    index = getattr(args, "index", None)
+    if index is not None:
+        return index.has_prefix(cache_path)
     return len(glob.glob("%s*.json" % cache_path)) > 0
 
 
@@ -32,6 +50,9 @@ def search_cache_prefix(image, args):
     Determine if a cache entry exists for any tag.
     """
     cache_path = get_cache_prefix(image, args)
+    index = getattr(args, "index", None)
+    if index is not None:
+        return index.search_prefix(cache_path)
     return glob.glob("%s*.json" % cache_path)
 
 
@@ -96,21 +117,17 @@ def ensure_unique_prefix(org_prefix, registry_prefix, repo_prefix):
     return True
 
 
-def cleanup():
+def cleanup(container, tmpdir=None):
     """
-    Cleanup command for running in action - will remove all containers.
+    Cleanup after a failed container.
+
+    Only the container guts ran (and its extraction, if we have the temporary
+    directory) are removed. Pulled images are kept, and evicted within a disk
+    budget (see images.ImageBudget) so shared base layers are not pulled again.
     """
-    for cmd in [
-        "docker stop $(docker ps -a -q)",
-        "docker rm $(docker ps -a -q)",
-        "docker system prune --all --force",
-    ]:
-        try:
-            os.system(cmd)
-        except Exception:
-            continue
-    for path in glob.glob("/tmp/guts*"):
-        shutil.rmtree(path)
+    guts.remove_container(container)
+    if tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
 
 class Options:
@@ -122,38 +139,71 @@ class Options:
         setattr(self, key, value)
 
 
+class RunOptions(Options):
+    """
+    Options for an update run, with the defaults of update-cache.
+    """
+
+    tag_workers = 1
+    tags_url = None
+    tags_ttl = 86400
+    tags_cache_size = 100000
+    refresh_tags = False
+    registry_tags = None
+    guts_workers = 1
+    max_pulls = None
+    queue_size = None
+    pack = None
+    shard = None
+    resume = True
+    layer_cache = False
+    layer_cache_size = 2048
+    digests = False
+    image_budget = 10240
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise TypeError(f"{key} is not an option for an update run.")
+            self.add_option(key, value)
+
+
 class CacheEntry:
     """
     A loaded cache entry that can be used to parse aliases.
     """
 
     def __init__(self, cache_file, cache, counts):
-        self.aliases = utils.read_json(cache_file)
         self.file = cache_file
         self.parse_image_uri(cache)
         self.counts = counts
+        self._aliases = None
+
+    @property
+    def aliases(self):
+        """
+        Aliases are loaded from the cache file when first needed.
+        """
+        if self._aliases is None:
+            self.load()
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, aliases):
+        self._aliases = aliases
+
+    def load(self):
+        """
+        Load aliases from the cache file.
+        """
+        self._aliases = utils.read_json(self.file)
+        return self
 
     def parse_image_uri(self, cache):
         """
         Given the stated pattern to store a letter, remove it.
         """
-        # Get the path relative to root
-        registry_uri = os.path.relpath(self.file, cache)
-
-        # Remove any likely prefix
-        parts = registry_uri.split(os.sep)
-        parsed = []
-        for i, part in enumerate(parts):
-            if len(part) == 1 and i + 1 < len(parts):
-                if parts[i + 1][0] == part:
-                    continue
-            parsed.append(part)
-        registry_uri = os.sep.join(parsed)
-
-        # We really only need the container uri,
-        image, tag = registry_uri.replace(".json", "").split(":", 1)
-        self.image = image
-        self.tag = tag
+        self.image, self.tag = store.parse_image_uri(self.file, cache)
 
     @property
     def image_name(self):
@@ -166,47 +216,46 @@ class CacheEntry:
         """
         Filter down aliases to sorted set of "keepers"
         """
-        # Derive this once
-        image_name = self.image_name
+        # Derive this once, as a pattern (or a literal name if not valid)
+        image_name = self.image_name.lower()
+        try:
+            pattern = re.compile(image_name)
+        except re.error:
+            pattern = re.compile(re.escape(image_name))
 
         # Look up counts and always take the number under a threshold (10)
         keepers = {}
-        for x, path in self.aliases.items():
-
-            if not filters.include_path(path):
-                continue
+        for x, path in filters.filter_paths(self.aliases).items():
 
             # Always use a regular expression of the image name to include
-            if re.search(image_name.lower(), path.lower()):
+            if pattern.search(path.lower()):
                 keepers[x] = path
 
             # Always take the very unique ones!
-            elif (self.counts.get(x) or 0) <= min_count and filters.include_path(path):
+            elif (self.counts.get(x) or 0) <= min_count:
                 keepers[x] = path
 
         # of the remaining we have, sorted by count, keep top N (lower numbers == more unique)
         alias_counts = {x: self.counts[x] for x in self.aliases if x not in keepers}
-
-        # Sort lowest to highest
-        sorted_counts = {}
-        sorted_keys = sorted(alias_counts, key=alias_counts.get)
-        for x in sorted_keys:
-            sorted_counts[x] = alias_counts[x]
-
-        # Turn into tuples
-        sorted_counts = list(sorted_counts.items())
-
-        while add_count > 0 and sorted_counts:
-            keeper, keeper_count = sorted_counts.pop(0)
-            if filters.include_path(keeper) and keeper_count < max_count:
-                keepers[keeper] = self.aliases[keeper]
-                add_count -= 1
+        candidates = [
+            x
+            for x, count in alias_counts.items()
+            if count < max_count and filters.include_path(x)
+        ]
+
+        # Select lowest to highest (ties keep their order) with a bounded heap
+        for keeper in heapq.nsmallest(add_count, candidates, key=alias_counts.get):
+            keepers[keeper] = self.aliases[keeper]
         return keepers
 
 
-def iter_new_cache(cache, registry):
+def iter_new_cache(cache, registry, workers=1):
     """
     Yield new entries in the cache, loaded.
+
+    The image is derived from the path, so we only read aliases for entries
+    that are not in the registry. With more than one worker, entries are
+    loaded ahead on a pool of threads and yielded (in order) when ready.
     """
     # This assumes counts at the root
     counts = os.path.join(cache, "counts.json")
@@ -222,24 +271,251 @@ def iter_new_cache(cache, registry):
     # Keep track of those we've seen in the cache
     seen = set()
 
-    # For each entry in the cache (which might not be in our registry) check for it!
-    for cache_file in utils.recursive_find(cache, ".json"):
-        basename = os.path.basename(cache_file)
-        if basename in ["skips.json", "counts.json"]:
+    def iter_entries():
+        # For each entry in the cache (which might not be in our registry) check for it!
+        for cache_file in utils.find_files(cache, ".json", workers=workers):
+            basename = os.path.basename(cache_file)
+            if basename in defaults.reserved_files:
+                continue
+
+            # TODO need to add variable here to ensure we get the right image
+            # Prepare a cache entry (global counts help later)
+            entry = CacheEntry(cache_file, cache, counts)
+            seen.add(entry.image)
+
+            # Look for same name in registry
+            container_dir = os.path.join(registry, entry.image)
+            if os.path.exists(container_dir):
+                continue
+
+            print(f"Image {entry.image} found in cache and not in registry!")
+            yield entry
+
+    for entry, _ in utils.iter_ordered(CacheEntry.load, iter_entries(), workers):
+        yield entry
+
+
+def iter_contenders(containers, args, skips):
+    """
+    Yield unique images (without tags) that are not cached or skipped.
+
+    Images finished in an interrupted run are not skipped on the word of the
+    checkpoint, as their entries are only kept if the run was committed.
+    """
+    report = getattr(args, "report", None)
+    seen = set()
+    for image in containers:
+        if ":" in image.rsplit("/", 1)[-1]:
+            image, _ = image.rsplit(":", 1)
+
+        print(f"Contender image {image}")
+
+        # Don't do repeats
+        if image in seen or image in skips:
             continue
+        seen.add(image)
+
+        # Images we have aliases for are hits, and the rest are looked up
+        cached = has_cache_entry(image, args)
+        if report is not None:
+            report.count("alias_cache_hits" if cached else "alias_cache_misses")
+        if not cached:
+            yield image
 
-        # TODO need to add variable here to ensure we get the right image
-        # Prepare a cache entry (global counts help later)
-        entry = CacheEntry(cache_file, cache, counts)
-        seen.add(entry.image)
 
-        # Look for same name in registry
-        container_dir = os.path.join(registry, entry.image)
-        if os.path.exists(container_dir):
+def iter_listings(
+    images, checkpoint, workers=1, url=None, cache=None, report=None, client=None
+):
+    """
+    Yield (image, tags) for each image, recording when it was listed.
+
+    Listings are kept by the tag cache (not the checkpoint), so a resumed run
+    finds them there. Given a registry.RegistryClient, tags for images on the
+    registries it lists tags for are listed from the registry.
+    """
+    session = tags.get_session(workers)
+
+    def retrieve(image):
+        with reports.time_phase(report, image, "tags"):
+            return tags.get_tags(
+                image, session=session, url=url, cache=cache, client=client
+            )
+
+    for image, listing in utils.iter_ordered(retrieve, images, workers=workers):
+        if listing is not None and "listed" not in checkpoint.get(image):
+            checkpoint.record(image, "tags", listed=time.time())
+        yield image, listing
+
+
+def iter_selected(listings, uris, skips, checkpoint=None, report=None):
+    """
+    Given (image, tags) listings, yield (image, tag) with the latest tag.
+
+    Images without tags that we can order are added to skips, and images we
+    could not retrieve tags for (None) are skipped for this run only. Given a
+    checkpoint, the tag chosen in an interrupted run is reused.
+    """
+    for image, listing in listings:
+
+        # We couldn't retrieve tags (e.g., a timeout), so try again next run
+        if listing is None:
+            print(f"Skipping {image} for this run, tags could not be retrieved.")
+            if report is not None:
+                report.skip(image, "tags-error")
             continue
 
-        print(f"Image {entry.image} found in cache and not in registry!")
-        yield entry
+        uris[image] = listing
+
+        # We already chose a tag for this image
+        state = checkpoint.get(image) if checkpoint is not None else {}
+        if "tag" in state:
+            print(f"Looking up aliases for {image}:{state['tag']} (resumed)")
+            if report is not None:
+                report.count("resumed")
+            yield image, state["tag"]
+            continue
+
+        # If we couldn't get tags, add to skips and continue
+        if not listing or "UNAUTHORIZED" in listing[0]:
+            print(f"Skipping {image}, UNAUTHORIZED in tag.")
+            skips.add(image)
+            if report is not None:
+                report.skip(image, "unauthorized")
+            continue
+
+        # The latest tag, by version (a fast path, or the tags pipeline)
+        try:
+            with reports.time_phase(report, image, "order"):
+                tag = pipelines.select_tag(listing)
+        except Exception as e:
+            print(f"Ordering of tag failed: {e}")
+            if report is not None:
+                report.set_status(image, "failed", reason="order")
+            continue
+
+        # If we aren't able to order versions.
+        if not tag:
+            print(f"No ordered tags for {image}, skipping.")
+            skips.add(image)
+            if report is not None:
+                report.skip(image, "no-ordered-tags")
+            continue
+
+        if checkpoint is not None:
+            checkpoint.record(image, "tag", tag=tag)
+        print(f"Looking up aliases for {image}:{tag}")
+        yield image, tag
+
+
+def iter_checkpoint(selected, checkpoint):
+    """
+    Record that guts are in progress for each (image, tag) as it is handed on.
+    """
+    for image, tag in selected:
+        checkpoint.record(image, "guts")
+        yield image, tag
+
+
+def iter_cache_aliases(
+    selected, args, guts_workers=1, max_pulls=None, no_cleanup=False, streaming=False
+):
+    """
+    Cache aliases for each selected (image, tag), yielding (image, error).
+    """
+    report = getattr(args, "report", None)
+    images = getattr(args, "images", None)
+
+    # With one worker, generate in process (guts scope a temporary directory
+    # to the process, so a streaming run uses worker processes instead)
+    if guts_workers <= 1 and not streaming:
+        for image, tag in selected:
+            error = None
+            with guts.scoped_tmpdir() as tmpdir:
+                try:
+                    cache_aliases(image, args, tag)
+                except:
+                    error = "Failed to cache aliases"
+                    if report is not None:
+                        report.skip(image, "guts-failed")
+                    if not no_cleanup:
+                        with reports.time_phase(report, image, "cleanup"):
+                            cleanup(f"{image}:{tag}", tmpdir)
+            if images is not None and not no_cleanup:
+                images.evict()
+            yield image, error
+        return
+
+    # Images with the digest of an entry we have are written here (no pull)
+    digests = getattr(args, "digests", None)
+    resolved = {}
+    reused = collections.deque()
+
+    def iter_unique(selected):
+        for image, tag in selected:
+            digest = resolve_digest(image, args, tag)
+            if reuse_digest(image, args, tag, digest) is not None:
+                reused.append(image)
+                continue
+            resolved[(image, tag)] = digest
+            yield image, tag
+
+    if digests is not None:
+        selected = iter_unique(selected)
+
+    # Containers handed to workers, and not finished (their layers are kept
+    # when pulled images are evicted beyond the budget)
+    pending = set()
+
+    def iter_pending(selected):
+        for image, tag in selected:
+            pending.add(f"{image}:{tag}")
+            yield image, tag
+
+    layer_cache = getattr(args, "layer_cache", None)
+    results = guts.iter_generate(
+        iter_pending(selected),
+        workers=max(guts_workers, 1),
+        max_pulls=max_pulls,
+        no_cleanup=no_cleanup,
+        layer_cache=(layer_cache.root, layer_cache.max_bytes) if layer_cache else None,
+    )
+    for (image, tag), (aliases, error, stats) in results:
+        while reused:
+            yield reused.popleft(), None
+        hits, misses = stats.pop("layer_hits", 0), stats.pop("layer_misses", 0)
+        if layer_cache is not None:
+            layer_cache.record(hits, misses)
+        container = f"{image}:{tag}"
+        pending.discard(container)
+        size = stats.pop("bytes", 0) or 0
+        if images is not None and size:
+            images.add(container, size)
+            if not no_cleanup:
+                images.evict(pending)
+        if report is not None:
+            report.count("pulled_bytes", size)
+            for phase, seconds in stats.items():
+                report.add_time(image, phase, seconds)
+        if error is None:
+            filename = get_cache_entry(image, args, tag)
+            with reports.time_phase(report, image, "write"):
+                write_cache_entry(filename, aliases, index=args.index)
+            digest = resolved.pop((image, tag), None)
+            if digest is not None:
+                digests.set(digest, filename)
+            if report is not None:
+                report.set_status(image, "generated", tag=tag)
+        else:
+            print(f"Issue generating aliases for {image}:{tag}: {error}")
+            if report is not None:
+                report.skip(image, "guts-failed")
+
+        # The worker died (e.g., out of memory), so try again next run
+        if error == guts.worker_died:
+            continue
+        yield image, error
+    while reused:
+        yield reused.popleft(), None
 
 
 def update(
@@ -251,10 +527,14 @@ def update(
     repo_prefix=False,
     skips_file=None,
     no_cleanup=False,
+    options=None,
+    report=None,
 ):
     """
     Update a container cache from a listing of containers
     """
+    options = options or RunOptions()
+
     # Ensure we have unique set
     containers = list(set(containers))
 
@@ -266,16 +546,30 @@ def update(
     if namespace:
         containers = ["%s/%s" % (namespace, x) for x in containers]
 
+    # Only keep images in our shard (by a stable hash of the image name)
+    if options.shard:
+        try:
+            index, count = shards.parse_shard(options.shard)
+        except ValueError as e:
+            sys.exit(str(e))
+        containers = shards.filter_shard(containers, index, count)
+        print(f"Shard {index}/{count} has {len(containers)} containers.")
+
     # Ensure our alias cache exists
     if not os.path.exists(root):
         utils.mkdir_p(root)
 
-    # Read in the URIs to skip
-    if not skips_file:
+    # Read in the URIs to skip (and any journal of skips from an earlier run)
+    if not skips_file and options.shard:
+        skips_file = shards.get_skips_file(root, index, count)
+    elif not skips_file:
         skips_file = os.path.join(root, "skips.json")
-    skips = set()
-    if os.path.exists(skips_file):
-        skips = set(utils.read_json(skips_file))
+    skips = skiplist.SkipsJournal(skips_file)
+
+    # A shard also honors skips from before the cache was sharded
+    default_skips = os.path.join(root, "skips.json")
+    if options.shard and skips_file != default_skips and os.path.exists(default_skips):
+        skips.update(utils.read_json(default_skips))
 
     # Get lookup of container images to tags
     uris = {}
@@ -286,59 +580,169 @@ def update(
     args.add_option("org_prefix", org_prefix)
     args.add_option("registry_prefix", registry_prefix)
     args.add_option("repo_prefix", repo_prefix)
+    args.add_option("report", report)
+
+    # The registry client is shared by tag workers and the guts stage
+    args.add_option(
+        "registry",
+        registry.RegistryClient(
+            workers=options.tag_workers + 1, tag_registries=options.registry_tags
+        ),
+    )
+    args.add_option("images", budgets.ImageBudget(options.image_budget * 1024 * 1024))
+    args.add_option("layer_cache", None)
+    if options.layer_cache:
+        args.layer_cache = layers.LayerCache(
+            os.path.join(root, defaults.state_dir, "layers"),
+            max_bytes=options.layer_cache_size * 1024 * 1024,
+        )
 
-    # Use the latest for each unique
-    for image in containers:
-        if ":" in image:
-            image, _ = image.split(":", 1)
-
-        print(f"Contender image {image}")
-
-        # Don't do repeats
-        if has_cache_entry(image, args) or image in uris or image in skips:
-            continue
-
-        print(f"Retrieving tags for {image}")
-        tags = requests.get(f"https://crane.ggcr.dev/ls/{image}")
-        tags = [x for x in tags.text.split("\n") if x]
-        uris[image] = tags
-
-        # If we couldn't get tags, add to skips and continue
-        if "UNAUTHORIZED" in tags[0]:
-            print(f"Skipping {image}, UNAUTHORIZED in tag.")
-            skips.add(image)
-            continue
-
-        # The updated and transformed items
-        try:
-            ordered = p.run(list(tags), unwrap=False)
-        except Exception as e:
-            print(f"Ordering of tag failed: {e}")
-            continue
+    # Digests of the entries we generate (a shard also reads the root's)
+    args.add_option("digests", None)
+    if options.digests:
+        digests_file = os.path.join(root, defaults.state_dir, "digests.json")
+        if options.shard:
+            args.digests = digestmap.DigestMap(
+                shards.get_digests_file(root, index, count), root
+            )
+            args.digests.load(digests_file)
+        else:
+            args.digests = digestmap.DigestMap(digests_file, root)
+
+    # Index the cache once (or use a pack) so checks for entries are lookups
+    if options.pack:
+        args.add_option("index", store.PackedCache(options.pack, root))
+    else:
+        args.add_option("index", store.CacheIndex(root))
+    print(f"Found {len(args.index)} existing cache entries.")
+
+    # Tag listings are cached under the root, and fresh listings are reused
+    tag_cache = tags.TagCache(
+        os.path.join(root, defaults.state_dir, "tags"),
+        ttl=options.tags_ttl,
+        max_entries=options.tags_cache_size,
+        refresh=options.refresh_tags,
+    )
+
+    # The phase each image reached is saved, in case the run is interrupted
+    # (and listings older than the tag cache allows are listed again)
+    name = f"checkpoint-{index}-of-{count}.json" if options.shard else "checkpoint.json"
+    checkpoint_file = os.path.join(root, defaults.state_dir, name)
+    if not options.resume and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    checkpoint = checkpoints.Checkpoint(
+        checkpoint_file, ttl=0 if options.refresh_tags else options.tags_ttl
+    )
+
+    def iter_select(listings):
+        selected = iter_selected(listings, uris, skips, checkpoint, report)
+        return iter_checkpoint(selected, checkpoint)
+
+    # With workers, stages stream through bounded queues (or are chained)
+    streaming = options.tag_workers > 1 or options.guts_workers > 1
+
+    # Tags are retrieved concurrently (in order) for the latest of each unique
+    steps = [
+        (
+            "listing",
+            functools.partial(iter_contenders, args=args, skips=skips),
+        ),
+        (
+            "tags",
+            functools.partial(
+                iter_listings,
+                checkpoint=checkpoint,
+                workers=options.tag_workers,
+                url=options.tags_url,
+                cache=tag_cache,
+                report=report,
+                client=args.registry,
+            ),
+        ),
+        ("select", iter_select),
+        (
+            "guts",
+            functools.partial(
+                iter_cache_aliases,
+                args=args,
+                guts_workers=options.guts_workers,
+                max_pulls=options.max_pulls,
+                no_cleanup=no_cleanup,
+                streaming=streaming,
+            ),
+        ),
+    ]
+
+    if streaming:
+        pipeline = stages.Pipeline(
+            options.queue_size or 2 * max(options.tag_workers, options.guts_workers),
+            report=report,
+        )
+        for name, func in steps:
+            pipeline.add_stage(name, func)
+        results = pipeline.run(containers)
+    else:
+        results = containers
+        for _, func in steps:
+            results = func(results)
+
+    # Skips are saved as we go (appended to the journal)
+    try:
+        for image, error in results:
+            if error is not None:
+                skips.add(image)
+            checkpoint.record(image, "done")
+
+    # Stop any stages still running, and write skips back to file
+    finally:
+        results.close()
+        skips.close()
+        checkpoint.close()
+        if args.digests is not None:
+            args.digests.save()
+
+    # We finished, so there is nothing to resume
+    checkpoint.remove()
+
+    print(f"Tag listings: {tag_cache.hits} from cache, {tag_cache.misses} retrieved.")
+    tag_cache.prune()
+    if args.layer_cache is not None:
+        hits, misses = args.layer_cache.hits, args.layer_cache.misses
+        rate = args.layer_cache.hit_rate
+        print(f"Layer cache: {hits} hits, {misses} misses ({rate:.0%} hit rate).")
+        args.layer_cache.prune()
+        if report is not None:
+            report.count("layer_cache_hits", hits)
+            report.count("layer_cache_misses", misses)
+    if args.images.evicted and report is not None:
+        report.count("evicted_images", args.images.evicted)
+    if args.digests is not None:
+        hits, misses = args.digests.hits, args.digests.misses
+        print(f"Digests: {hits} reused, {misses} not seen before.")
+        if report is not None:
+            report.count("digest_hits", hits)
+            report.count("digest_misses", misses)
+    if report is not None:
+        report.finish(tag_cache)
 
-        # If we aren't able to order versions.
-        if not ordered:
-            print(f"No ordered tags for {image}, skipping.")
-            skips.add(image)
-            continue
+    # Return uris and skips
+    return uris, set(skips)
 
-        tag = ordered[0]._original
-        container = f"{image}:{tag}"
-        print(f"Looking up aliases for {container}")
-        try:
-            cache_aliases(image, args, tag)
-        except:
-            skips.add(image)
-            if not no_cleanup:
-                cleanup()
-        # Save as we go
-        utils.write_json(sorted(list(skips)), skips_file)
 
-    # Write skips back to file for faster parsing
-    utils.write_json(sorted(list(skips)), skips_file)
+def write_cache_entry(filename, aliases, index=None):
+    """
+    Write aliases to a cache entry, creating the parent directory.
 
-    # Return uris and skips
-    return uris, skips
+    Given an index (or pack), the entry is written (and indexed) there.
+    """
+    print(f"Writing {filename} with aliases")
+    if index is not None:
+        index.write(filename, aliases)
+        return filename
+    parent = os.path.dirname(filename)
+    utils.mkdir_p(parent)
+    utils.write_json(aliases, filename)
+    return filename
 
 
 def cache_aliases(image, args, tag):
@@ -347,34 +751,105 @@ def cache_aliases(image, args, tag):
     """
     filename = get_cache_entry(image, args, tag)
 
-    # Case 1: we already have this exact tag!
-    if os.path.exists(filename):
-        return utils.read_json(filename)
+    # Entries are read from the index (or pack) if we have one
+    index = getattr(args, "index", None)
+    read = index.read if index is not None else utils.read_json
+    report = getattr(args, "report", None)
 
-    # Case 2: we have a starter recipe from another tag to update
-    matches = search_cache_prefix(image, args)
+    # Case 1: we already have this exact tag!
+    if has_entry(filename, args):
+        if report is not None:
+            report.set_status(image, "cached", tag=tag)
+        return read(filename)
+
+    # Case 2: an entry has the same manifest digest (e.g., a re-tag)
+    digest = None
+    if getattr(args, "digests", None) is not None:
+        digest = resolve_digest(image, args, tag)
+        aliases = reuse_digest(image, args, tag, digest)
+        if aliases is not None:
+            return aliases
+
+    # Case 3: we have a starter recipe from another tag to update
+    # (only if we don't know the digest, otherwise it might not be the same)
+    matches = search_cache_prefix(image, args) if digest is None else []
     if matches:
-        return utils.read_json(matches[0])
+        if report is not None:
+            report.set_status(image, "cached", tag=tag)
+        return read(matches[0])
 
-    # Generate guts if we haven't seen it yet
+    # Generate guts if we haven't seen it yet (from layers, if we can)
     container = f"{image}:{tag}"
-    gen = ManifestGenerator()
-    manifests = gen.diff(container)
-
-    # Assemble aliases
-    aliases = {}
-    for path in list(manifests.values())[0]["diff"]["unique_paths"]:
-        name = os.path.basename(path)
-        if not filters.include_path(path):
-            continue
+    aliases = None
+    layer_cache = getattr(args, "layer_cache", None)
+    if layer_cache is not None:
+        with reports.time_phase(report, image, "layers"):
+            aliases = guts.generate_layer_aliases(
+                container, layer_cache, getattr(args, "registry", None)
+            )
+
+    if aliases is None:
+        with reports.time_phase(report, image, "pull"):
+            size = guts.pull_image(container)
+        if report is not None:
+            report.count("pulled_bytes", size)
+        if getattr(args, "images", None) is not None and size:
+            args.images.add(container, size)
+        with reports.time_phase(report, image, "guts"):
+            aliases = guts.generate_aliases(container)
+
+    with reports.time_phase(report, image, "write"):
+        write_cache_entry(filename, aliases, index=index)
+    if digest is not None:
+        args.digests.set(digest, filename)
+    if report is not None:
+        report.set_status(image, "generated", tag=tag)
+    return aliases
 
-        if name in aliases:
-            print(f"Warning, duplicate alias {name}")
-        print(path)
-        aliases[name] = path
 
-    parent = os.path.dirname(filename)
-    utils.mkdir_p(parent)
-    print(f"Writing {filename} with aliases")
-    utils.write_json(aliases, filename)
+def has_entry(filename, args):
+    """
+    Determine if a cache entry exists (in the index or pack, if we have one).
+    """
+    index = getattr(args, "index", None)
+    if index is not None:
+        return filename in index
+    return os.path.exists(filename)
+
+
+def resolve_digest(image, args, tag):
+    """
+    Get the manifest digest for an image tag, or None if we cannot resolve it.
+    """
+    with reports.time_phase(getattr(args, "report", None), image, "digest"):
+        try:
+            return args.registry.get_digest(f"{image}:{tag}")
+        except Exception as e:
+            print(f"Cannot resolve digest for {image}:{tag}: {e}")
+
+
+def reuse_digest(image, args, tag, digest):
+    """
+    Reuse the aliases of an entry with the same manifest digest, if we have one.
+
+    The aliases are written for the tag without a pull. Returns None if no
+    entry has the digest (or we don't know it), so aliases are generated.
+    """
+    if digest is None:
+        return
+    entry = args.digests.get(digest)
+    found = entry is not None and has_entry(entry, args)
+    args.digests.record(found)
+    if not found:
+        return
+
+    index = getattr(args, "index", None)
+    read = index.read if index is not None else utils.read_json
+    report = getattr(args, "report", None)
+    aliases = read(entry)
+    print(f"{image}:{tag} has the same digest as {os.path.relpath(entry, args.root)}")
+    with reports.time_phase(report, image, "write"):
+        write_cache_entry(get_cache_entry(image, args, tag), aliases, index=index)
+    if report is not None:
+        report.set_status(image, "deduplicated", tag=tag, digest=digest)
     return aliases
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+
+import container_discovery.utils as utils
+
+# Phases an image goes through in update-cache, in order
+phases = ["tags", "tag", "guts", "done"]
+
+
+class Checkpoint:
+    """
+    A checkpoint of an update-cache run, with the phase each image reached.
+
+    Each change is appended (and flushed) to a file of json lines, and the
+    latest state for an image is the merge of its lines (the phase, when it
+    was listed, and the chosen tag). A restarted run reuses the chosen tag,
+    and the file is removed when a run finishes. Given a ttl, images with a
+    listing older than ttl seconds start over. Stages of a streaming run
+    record from their own threads.
+    """
+
+    def __init__(self, filename, ttl=None):
+        self.filename = filename
+        self.ttl = ttl
+        self.states = {}
+        self.fd = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Load the state of images from an interrupted run.
+        """
+        if not os.path.exists(self.filename):
+            return
+        lines = utils.read_lines(self.filename)
+        for line in lines:
+            record = json.loads(line)
+            self.states.setdefault(record["image"], {}).update(record)
+
+        # Stale images are dropped from the file too, so they are not merged
+        # with the state of the next run when it is loaded again
+        stale = {x for x, state in self.states.items() if self.is_stale(state)}
+        if stale:
+            print(f"Dropping {len(stale)} images with stale tags from checkpoint.")
+            for image in stale:
+                del self.states[image]
+            with open(self.filename, "w") as fd:
+                for line in lines:
+                    if json.loads(line)["image"] not in stale:
+                        fd.write(line + "\n")
+        print(f"Resuming from checkpoint with {len(self.states)} images.")
+
+    def is_stale(self, state):
+        """
+        Determine if the listing for an image is older than the ttl.
+        """
+        if self.ttl is None:
+            return False
+        return time.time() - state.get("listed", 0) >= self.ttl
+
+    def record(self, image, phase, **kwargs):
+        """
+        Record that an image reached a phase, with any details (e.g., the tag).
+        """
+        record = {"image": image, "phase": phase, **kwargs}
+        with self.lock:
+            if self.closed:
+                raise ValueError(f"Checkpoint {self.filename} is closed.")
+            self.states.setdefault(image, {}).update(record)
+            if self.fd is None:
+                utils.mkdir_p(os.path.dirname(os.path.abspath(self.filename)))
+                self.fd = open(self.filename, "a")
+            self.fd.write(json.dumps(record) + "\n")
+            self.fd.flush()
+
+    def get(self, image):
+        """
+        Get the state for an image, if it has one.
+        """
+        return self.states.get(image) or {}
+
+    def get_phase(self, image):
+        """
+        Get the phase an image reached, or None.
+        """
+        return self.get(image).get("phase")
+
+    def close(self):
+        """
+        Close the checkpoint, so a stage still running cannot record to it.
+        """
+        with self.lock:
+            self.closed = True
+            if self.fd is not None:
+                self.fd.close()
+                self.fd = None
+
+    def remove(self):
+        """
+        Remove the checkpoint when a run has finished.
+        """
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.states = {}
@@ -46,6 +46,38 @@ def get_parser():
         dest="counts_json",
         help="Counts json file (defaults to counts.json in root)",
     )
+    count.add_argument(
+        "--compact",
+        action="store_true",
+        default=False,
+        help="Write compact json (no whitespace) for counts read by software",
+    )
+    count.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Only read files changed since the last run (state in counts-state.json)",
+    )
+    count.add_argument(
+        "--verify",
+        action="store_true",
+        default=False,
+        help="Verify incremental counts against a full recount",
+    )
+    count.add_argument(
+        "--pack",
+        help="Count entries in a packed cache (SQLite file) instead of the root",
+    )
+    count.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to count shards of the cache (defaults to 1)",
+    )
+    count.add_argument(
+        "--index",
+        help="Also write a reverse alias index to this file, in the same pass",
+    )
 
     cache = subparsers.add_parser(
         "update-cache",
@@ -87,6 +119,183 @@ def get_parser():
         default=False,
         help="Don't run cleanup (e.g., if doing local work)",
     )
+    cache.add_argument(
+        "--tag-workers",
+        dest="tag_workers",
+        type=int,
+        default=1,
+        help="Number of workers to retrieve tag listings concurrently (defaults to 1)",
+    )
+    cache.add_argument(
+        "--tags-url",
+        dest="tags_url",
+        help="URL to list tags, formatted with {image} (defaults to crane.ggcr.dev)",
+    )
+    cache.add_argument(
+        "--registry-tags",
+        dest="registry_tags",
+        action="append",
+        default=None,
+        help="List tags from this registry's v2 API (e.g., quay.io, or '*' for all)",
+    )
+    cache.add_argument(
+        "--tags-ttl",
+        dest="tags_ttl",
+        type=int,
+        default=86400,
+        help="Seconds a cached tag listing is fresh (defaults to 86400, one day)",
+    )
+    cache.add_argument(
+        "--tags-cache-size",
+        dest="tags_cache_size",
+        type=int,
+        default=100000,
+        help="Maximum number of cached tag listings (defaults to 100000)",
+    )
+    cache.add_argument(
+        "--refresh-tags",
+        dest="refresh_tags",
+        action="store_true",
+        default=False,
+        help="Retrieve all tag listings, bypassing the tag cache",
+    )
+    cache.add_argument(
+        "--pack",
+        help="Store entries in a packed cache (SQLite file) instead of json files",
+    )
+    cache.add_argument(
+        "--guts-workers",
+        dest="guts_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes to pull and generate guts (defaults to 1)",
+    )
+    cache.add_argument(
+        "--max-pulls",
+        dest="max_pulls",
+        type=int,
+        help="Maximum concurrent pulls across guts workers (defaults to guts workers)",
+    )
+    cache.add_argument(
+        "--shard",
+        help="Only process shard i of N (e.g., 0/4) by a stable hash of the image",
+    )
+    cache.add_argument(
+        "--no-resume",
+        dest="no_resume",
+        action="store_true",
+        default=False,
+        help="Start over instead of resuming from the checkpoint of an interrupted run",
+    )
+    cache.add_argument(
+        "--layer-cache",
+        dest="layer_cache",
+        action="store_true",
+        default=False,
+        help="Derive aliases from cached listings of image layers, when we can",
+    )
+    cache.add_argument(
+        "--layer-cache-size",
+        dest="layer_cache_size",
+        type=int,
+        default=2048,
+        help="Maximum size of the layer cache in MB (defaults to 2048)",
+    )
+    cache.add_argument(
+        "--digests",
+        dest="digests",
+        action="store_true",
+        default=False,
+        help="Reuse aliases for new images with the manifest digest of an entry "
+        "generated with --digests (images already in the cache are skipped)",
+    )
+    cache.add_argument(
+        "--image-budget",
+        dest="image_budget",
+        type=int,
+        default=10240,
+        help="Disk budget in MB for images pulled by the run (defaults to 10240)",
+    )
+    cache.add_argument(
+        "--queue-size",
+        dest="queue_size",
+        type=int,
+        default=None,
+        help="Results waiting between stages (defaults to twice the workers)",
+    )
+    cache.add_argument(
+        "--report",
+        help="Write a json report with timings for each image and phase",
+    )
+    cache.add_argument(
+        "--prometheus",
+        help="Write run counters to a Prometheus textfile (e.g., for node exporter)",
+    )
+
+    merge = subparsers.add_parser(
+        "merge-shards",
+        description="Merge skips and entries from shards of update-cache.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    merge.add_argument(
+        "shards",
+        nargs="*",
+        help="Cache roots of shards run elsewhere (defaults to shards in the root)",
+    )
+    merge.add_argument("--root", help="Path to cache root.", default=os.getcwd())
+
+    for name, description in [
+        ("pack", "Import cache entries from the root into a packed cache."),
+        ("unpack", "Export cache entries from a packed cache into the root."),
+    ]:
+        packer = subparsers.add_parser(
+            name,
+            description=description,
+            formatter_class=argparse.RawTextHelpFormatter,
+        )
+        packer.add_argument("pack", help="Path to packed cache (SQLite file).")
+        packer.add_argument("--root", help="Path to cache root.", default=os.getcwd())
+
+    index = subparsers.add_parser(
+        "build-index",
+        description="Build a reverse index from alias to containers.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    index.add_argument(
+        "--root",
+        help="Root of cache with json files to index.",
+        default=os.getcwd(),
+    )
+    index.add_argument(
+        "--index",
+        help="Alias index file to write (defaults to aliases.index in root)",
+    )
+    index.add_argument(
+        "--pack",
+        help="Index entries in a packed cache (SQLite file) instead of the root",
+    )
+    index.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to read shards of the cache (defaults to 1)",
+    )
+
+    query = subparsers.add_parser(
+        "query",
+        description="Find containers that provide an alias.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    query.add_argument("alias", help="Alias (executable name) to look up.")
+    query.add_argument(
+        "--root",
+        help="Root of the cache the index was built for.",
+        default=os.getcwd(),
+    )
+    query.add_argument(
+        "--index",
+        help="Alias index file (defaults to aliases.index in root)",
+    )
 
     return parser
 
@@ -131,6 +340,12 @@ def run_main():
         from .count import main
     elif args.command == "update-cache":
         from .cache import main
+    elif args.command in ["pack", "unpack"]:
+        from .pack import main
+    elif args.command == "merge-shards":
+        from .merge import main
+    elif args.command in ["build-index", "query"]:
+        from .index import main
 
     # Pass on to the correct parser
     return_code = 0
@@ -2,6 +2,7 @@ import os
 import sys
 
 import container_discovery.cache as cache
+import container_discovery.report as reports
 import container_discovery.utils as utils
 
 
@@ -13,9 +14,22 @@ def main(args, parser, extra, subparser):
     print("            no cleanup: %s" % args.no_cleanup)
     print("             namespace: %s" % args.namespace)
     print("            skips file: %s" % args.skips_file)
+    print("                  pack: %s" % args.pack)
     print("     org letter prefix: %s" % args.org_letter_prefix)
     print("registry letter prefix: %s" % args.registry_letter_prefix)
     print("    repo letter prefix: %s" % args.repo_letter_prefix)
+    print("           tag workers: %s" % args.tag_workers)
+    print("              tags ttl: %s" % args.tags_ttl)
+    print("         registry tags: %s" % args.registry_tags)
+    print("          refresh tags: %s" % args.refresh_tags)
+    print("          guts workers: %s" % args.guts_workers)
+    print("                 shard: %s" % args.shard)
+    print("                resume: %s" % (not args.no_resume))
+    print("                report: %s" % args.report)
+    print("           layer cache: %s" % args.layer_cache)
+    print("               digests: %s" % args.digests)
+    print("          image budget: %s MB" % args.image_budget)
+    print("            queue size: %s" % args.queue_size)
 
     # We must have an existing containers text file
     if not args.containers or not os.path.exists(args.containers):
@@ -26,6 +40,29 @@ def main(args, parser, extra, subparser):
         x.strip() for x in utils.read_file(args.containers).split("\n") if x.strip()
     ]
 
+    # Keep timings and counters if we want a report
+    report = None
+    if args.report or args.prometheus:
+        report = reports.RunReport()
+
+    options = cache.RunOptions(
+        tag_workers=args.tag_workers,
+        tags_url=args.tags_url,
+        tags_ttl=args.tags_ttl,
+        tags_cache_size=args.tags_cache_size,
+        refresh_tags=args.refresh_tags,
+        registry_tags=args.registry_tags,
+        guts_workers=args.guts_workers,
+        max_pulls=args.max_pulls,
+        queue_size=args.queue_size,
+        pack=args.pack,
+        shard=args.shard,
+        resume=not args.no_resume,
+        layer_cache=args.layer_cache,
+        layer_cache_size=args.layer_cache_size,
+        digests=args.digests,
+        image_budget=args.image_budget,
+    )
     uris, skips = cache.update(
         containers,
         root=args.root,
@@ -35,6 +72,15 @@ def main(args, parser, extra, subparser):
         namespace=args.namespace,
         skips_file=args.skips_file,
         no_cleanup=args.no_cleanup,
+        options=options,
+        report=report,
     )
     print(f"Found {len(uris)} container identifiers.")
     print(f"Skipped {len(skips)} identifiers.")
+
+    if args.report:
+        print(f"Writing report to {args.report}")
+        report.save(args.report)
+    if args.prometheus:
+        print(f"Writing Prometheus textfile to {args.prometheus}")
+        report.save_prometheus(args.prometheus)
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import container_discovery.aliases as aliases
+import container_discovery.defaults as defaults
 import container_discovery.metrics as metrics
 import container_discovery.utils as utils
 
@@ -15,13 +17,44 @@ def main(args, parser, extra, subparser):
     if not args.counts_json:
         args.counts_json = os.path.join(root, "counts.json")
 
+    # State for incremental counts is not committed (it is kept by the action)
+    state_file = os.path.join(root, defaults.state_dir, "counts-state.json")
+
     # Show args to the user
     print("    root: %s" % root)
     print("  counts: %s" % args.counts_json)
+    print(" workers: %s" % args.workers)
+    if args.pack:
+        print("    pack: %s" % args.pack)
+    if args.incremental:
+        print("   state: %s" % state_file)
+    if args.index:
+        print("   index: %s" % args.index)
+    if args.compact:
+        print(" compact: %s" % args.compact)
+
+    if args.incremental and args.pack:
+        sys.exit("Incremental counts are not supported for a pack.")
+    if args.incremental and args.index:
+        sys.exit("An alias index needs a full walk, and cannot be incremental.")
 
     # Use provided library function to get counts
-    counts = metrics.get_total_counts(root)
+    if args.incremental:
+        counts = metrics.get_incremental_counts(root, state_file)
+    elif args.index:
+        counts = aliases.build_index(
+            root, args.index, workers=args.workers, pack=args.pack
+        )
+    else:
+        counts = metrics.get_total_counts(root, workers=args.workers, pack=args.pack)
+
+    # A full recount must give the same result
+    if args.incremental and args.verify:
+        full = metrics.get_total_counts(root, workers=args.workers, pack=args.pack)
+        if utils.print_json(counts) != utils.print_json(full):
+            sys.exit("Incremental counts do not match a full recount!")
+        print("Incremental counts match a full recount.")
 
     # Update and save to file!
     print(f"Writing counts to {args.counts_json}")
-    utils.write_json(counts, args.counts_json)
+    utils.write_json(counts, args.counts_json, compact=args.compact)
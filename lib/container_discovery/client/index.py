@@ -0,0 +1,38 @@
+import os
+import sys
+
+import container_discovery.aliases as aliases
+
+
+def main(args, parser, extra, subparser):
+
+    # The index is found in the root by default, for both commands
+    root = os.path.abspath(args.root) if args.root else None
+    if not args.index and root:
+        args.index = os.path.join(root, "aliases.index")
+
+    # Look up containers that provide an alias
+    if args.command == "query":
+        if not args.index or not os.path.exists(args.index):
+            sys.exit(f"{args.index} does not exist! Create it with build-index.")
+        index = aliases.AliasIndex(args.index)
+        results = index.query(args.alias)
+        index.close()
+        if not results:
+            sys.exit(f"No containers found that provide {args.alias}")
+        for result in results:
+            print(f"{result['container']}\t{result['path']}")
+        return
+
+    # Ensure it exists!
+    if not root or not os.path.exists(root):
+        sys.exit(f"{args.root} does not exist!")
+
+    # Show args to the user
+    print("    root: %s" % root)
+    print("   index: %s" % args.index)
+    print(" workers: %s" % args.workers)
+    if args.pack:
+        print("    pack: %s" % args.pack)
+
+    aliases.build_index(root, args.index, workers=args.workers, pack=args.pack)
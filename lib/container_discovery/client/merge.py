@@ -0,0 +1,21 @@
+import os
+import sys
+
+import container_discovery.shards as shards
+
+
+def main(args, parser, extra, subparser):
+
+    root = os.path.abspath(args.root)
+
+    # Show args to the user
+    print("    root: %s" % root)
+    print("  shards: %s" % " ".join(args.shards))
+
+    for path in [root] + args.shards:
+        if not os.path.exists(path):
+            sys.exit(f"{path} does not exist!")
+
+    copied, conflicts = shards.merge_shards(root, args.shards)
+    if conflicts:
+        sys.exit(f"{len(conflicts)} entries had conflicts, see above.")
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import container_discovery.store as store
+
+
+def main(args, parser, extra, subparser):
+
+    root = os.path.abspath(args.root)
+    pack = os.path.abspath(args.pack)
+
+    # Show args to the user
+    print("    root: %s" % root)
+    print("    pack: %s" % pack)
+
+    # Import from the directory layout into a pack
+    if args.command == "pack":
+        if not os.path.exists(root):
+            sys.exit(f"{root} does not exist!")
+        count = store.import_pack(root, pack)
+        print(f"Packed {count} cache entries into {pack}")
+        return
+
+    # Or export from a pack into the directory layout
+    if not os.path.exists(pack):
+        sys.exit(f"{pack} does not exist!")
+    count = store.export_pack(root, pack)
+    print(f"Unpacked {count} cache entries into {root}")
@@ -0,0 +1,8 @@
+# Json files that live alongside cache entries, but are not entries
+reserved_files = ["skips.json", "counts.json", "counts-state.json"]
+
+# Hidden directory in the cache root for state that is not committed
+state_dir = ".container-discovery"
+
+# Directories that never have cache entries (hidden directories are skipped too)
+skipped_dirs = ["__pycache__", "node_modules"]
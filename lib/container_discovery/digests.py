@@ -0,0 +1,77 @@
+import os
+import threading
+
+import container_discovery.utils as utils
+
+
+class DigestMap:
+    """
+    A map of manifest digests to the cache entry generated for them.
+
+    A tag with the digest of an image we already have (a re-tag, or the same
+    image under another name) can reuse its aliases without a pull. Entries
+    are stored relative to the cache root, so a map can be merged from shards
+    run elsewhere. Any number of maps can be loaded, and changes are saved to
+    the first.
+    """
+
+    def __init__(self, filename, root):
+        self.filename = filename
+        self.root = os.path.abspath(root)
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+        self.lock = threading.Lock()
+        self.load(filename)
+
+    def load(self, filename):
+        """
+        Load digests from a file (existing digests are kept).
+        """
+        if not os.path.exists(filename):
+            return
+        for digest, entry in utils.read_json(filename).items():
+            self.digests.setdefault(digest, entry)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __contains__(self, digest):
+        return digest in self.digests
+
+    def get(self, digest):
+        """
+        Get the path to the cache entry for a digest, if we have one.
+        """
+        entry = self.digests.get(digest)
+        if entry is not None:
+            return os.path.join(self.root, entry)
+
+    def set(self, digest, filename):
+        """
+        Record the cache entry generated for a digest.
+        """
+        with self.lock:
+            self.digests[digest] = os.path.relpath(filename, self.root)
+            self.changed = True
+
+    def record(self, hit):
+        """
+        Record that a digest was (or was not) found for an image.
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self):
+        """
+        Save the digests, if we have changes.
+        """
+        if not self.changed:
+            return
+        utils.mkdir_p(os.path.dirname(os.path.abspath(self.filename)))
+        utils.write_json(self.digests, self.filename, compact=True)
+        self.changed = False
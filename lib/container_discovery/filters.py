@@ -1,34 +1,78 @@
+import functools
 import os
 
+# Endings of paths that are not executables of interest
+excluded_endings = (
+    "post-link.sh",
+    ".debug",
+    "pre-link.sh",
+    ".so",
+    ".dll",
+    ".gz",
+    ".dna",
+    ".dox",
+    ".db",
+    ".db3",
+    ".config",
+    ".defaults",
+    ".dat",
+    ".dn",
+    ".d",
+    ".md",
+)
+
+
+class PathFilter:
+    """
+    A compiled filter for paths, with a memo of decisions.
+
+    The same paths recur across thousands of images, so decisions are kept
+    in a least recently used cache keyed by path.
+    """
+
+    def __init__(self, endings=excluded_endings, cache_size=2**16):
+        self.endings = tuple(endings)
+        self.include = functools.lru_cache(maxsize=cache_size)(self._include)
+
+    def _include(self, path):
+        """
+        Filter out binaries in system bins, and various manual filters
+        """
+        if path.endswith(self.endings):
+            return False
+        if os.path.basename(path).startswith(("_", ".")):
+            return False
+        if "[" in path or "]" in path or "README" in path:
+            return False
+        return (
+            "sbin" not in path
+            and "/usr/bin" not in path
+            and not path.startswith("/bin")
+        )
+
+    def filter(self, paths):
+        """
+        Filter a list of paths, or a dict with paths as values, to those included.
+        """
+        include = self.include
+        if isinstance(paths, dict):
+            return {k: v for k, v in paths.items() if include(v)}
+        return [x for x in paths if include(x)]
+
+
+# Shared filter, so the memo is shared across images
+path_filter = PathFilter()
+
 
 def include_path(path):
     """
     Filter out binaries in system bins, and various manual filters
     """
-    for ending in [
-        "post-link.sh",
-        ".debug",
-        "pre-link.sh",
-        ".so",
-        ".dll",
-        ".gz",
-        ".dna",
-        ".dox",
-        ".db",
-        ".db3",
-        ".config",
-        ".defaults",
-        ".dat",
-        ".dn",
-        ".d",
-        ".md",
-    ]:
-        if path.endswith(ending):
-            return False
-    if os.path.basename(path).startswith("_"):
-        return False
-    if os.path.basename(path).startswith("."):
-        return False
-    if "[" in path or "]" in path or "README" in path:
-        return False
-    return "sbin" not in path and "/usr/bin" not in path and not path.startswith("/bin")
+    return path_filter.include(path)
+
+
+def filter_paths(paths):
+    """
+    Filter a list of paths, or a dict with paths as values, in one call.
+    """
+    return path_filter.filter(paths)
@@ -0,0 +1,309 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import container_discovery.filters as filters
+import container_discovery.layers as layers
+import container_discovery.utils as utils
+
+# Shared limit on concurrent pulls, set for each worker process
+pulls = None
+
+# The error for containers in flight when a worker died (tried again next run)
+worker_died = "Guts worker died"
+
+
+def generate_aliases(container):
+    """
+    Generate guts for a container and derive aliases from the unique paths.
+    """
+    from container_guts.main import ManifestGenerator
+
+    gen = ManifestGenerator()
+    manifests = gen.diff(container)
+    return get_aliases(list(manifests.values())[0]["diff"]["unique_paths"])
+
+
+def get_aliases(paths):
+    """
+    Derive aliases (the basename of each path) from unique paths.
+    """
+    aliases = {}
+    for path in filters.filter_paths(paths):
+        name = os.path.basename(path)
+        if name in aliases:
+            print(f"Warning, duplicate alias {name}")
+        print(path)
+        aliases[name] = path
+    return aliases
+
+
+def generate_layer_aliases(container, cache, client=None):
+    """
+    Generate aliases for a container from cached (or new) layers of the image.
+
+    Returns None (so we generate guts instead) if we cannot use the layers.
+    """
+    try:
+        return get_aliases(layers.get_unique_paths(container, cache, client))
+    except Exception as e:
+        print(f"Cannot use layers for {container}, generating guts: {e}")
+
+
+def init_worker(tmpdir, semaphore):
+    """
+    Give a worker process its own temporary directory and the pull limit.
+
+    Guts extracts under the default temporary directory, so a worker cleaning
+    up after itself cannot remove an extraction from a neighbor.
+    """
+    global pulls
+    pulls = semaphore
+    tempfile.tempdir = tempfile.mkdtemp(prefix="worker-", dir=tmpdir)
+
+
+def run_docker(*args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL):
+    """
+    Run a docker command, returning the result (or None if docker cannot run).
+
+    Cleanup and eviction are best effort, so a missing docker binary is
+    reported and the run continues.
+    """
+    try:
+        return subprocess.run(
+            ["docker", *args], stdout=stdout, stderr=stderr, text=True, check=False
+        )
+    except OSError as e:
+        print(f"Cannot run docker {args[0]}: {e}")
+
+
+def get_image_size(container):
+    """
+    Get the size of a pulled image in bytes (or 0 if we cannot tell).
+    """
+    result = run_docker(
+        "image", "inspect", "--format", "{{.Size}}", container, stdout=subprocess.PIPE
+    )
+    if result is None:
+        return 0
+    try:
+        return int(result.stdout.strip())
+    except ValueError:
+        return 0
+
+
+def get_image_layers(container):
+    """
+    Get the layers (diff ids) of a pulled image, or an empty list if not pulled.
+    """
+    template = "{{json .RootFS.Layers}}"
+    result = run_docker(
+        "image", "inspect", "--format", template, container, stdout=subprocess.PIPE
+    )
+    if result is None:
+        return []
+    try:
+        return json.loads(result.stdout) or []
+    except ValueError:
+        return []
+
+
+def remove_image(container):
+    """
+    Remove a pulled image, returning True if it was removed.
+
+    Layers shared with other images are kept by docker.
+    """
+    print(f"Removing image {container}")
+    result = run_docker("rmi", container)
+    return result is not None and result.returncode == 0
+
+
+def remove_container(container):
+    """
+    Stop and remove the container guts runs for an image (keeping the image).
+    """
+    from container_guts.main.container.base import ContainerName
+
+    name = ContainerName(container).container_name
+    for command in [["stop", name], ["rm", "--force", name]]:
+        if run_docker(*command) is None:
+            return
+
+
+@contextlib.contextmanager
+def scoped_tmpdir():
+    """
+    Extract guts under a temporary directory of our own, yielding the path.
+
+    Guts extracts under the default temporary directory (and takes no
+    directory of its own), so this sets tempfile.tempdir for the process, and
+    cleanup after a failure can remove just this extraction. It is only safe
+    when no other thread uses tempfile meanwhile, so a streaming run generates
+    guts in a worker process instead. The directory is removed on the way out
+    if it is empty (guts removes its own files when it succeeds).
+    """
+    previous = tempfile.tempdir
+    tmpdir = tempfile.mkdtemp(prefix="guts-")
+    tempfile.tempdir = tmpdir
+    try:
+        yield tmpdir
+    finally:
+        tempfile.tempdir = previous
+        try:
+            os.rmdir(tmpdir)
+        except OSError:
+            pass
+
+
+def pull_image(container):
+    """
+    Pull a container, returning the size of the image in bytes.
+    """
+    print(f"Pulling {container}")
+    run_docker("pull", container, stdout=None, stderr=None)
+    return get_image_size(container)
+
+
+def pull(container):
+    """
+    Pull a container ahead of generation, holding a slot of the pull limit.
+    """
+    if pulls is None:
+        return pull_image(container)
+    with pulls:
+        return pull_image(container)
+
+
+def cleanup_worker(container):
+    """
+    Cleanup after a failed container, scoped to this worker.
+
+    The image is kept, and evicted (within a disk budget) by the main process.
+    """
+    remove_container(container)
+    tmpdir = tempfile.gettempdir()
+    for name in os.listdir(tmpdir):
+        shutil.rmtree(os.path.join(tmpdir, name), ignore_errors=True)
+
+
+def run_worker(container, no_cleanup=False, layer_cache=None):
+    """
+    Generate aliases for a container in a worker.
+
+    Given a layer cache (root, max_bytes) aliases are first derived from the
+    layers of the image. Returns (aliases, error, stats) where stats has the
+    seconds for each phase, the bytes pulled and layer cache hits and misses,
+    to add to the report of the run.
+    """
+    stats = {}
+    if layer_cache is not None:
+        start = time.perf_counter()
+        cache = layers.LayerCache(*layer_cache)
+        aliases = generate_layer_aliases(container, cache)
+        stats.update(
+            layers=time.perf_counter() - start,
+            layer_hits=cache.hits,
+            layer_misses=cache.misses,
+        )
+        if aliases is not None:
+            return aliases, None, stats
+
+    phase, start = "pull", time.perf_counter()
+    try:
+        stats["bytes"] = pull(container)
+        stats["pull"] = time.perf_counter() - start
+        phase, start = "guts", time.perf_counter()
+        aliases = generate_aliases(container)
+        stats["guts"] = time.perf_counter() - start
+        return aliases, None, stats
+    except (Exception, SystemExit) as e:
+        stats[phase] = time.perf_counter() - start
+        if not no_cleanup:
+            start = time.perf_counter()
+            cleanup_worker(container)
+            stats["cleanup"] = time.perf_counter() - start
+        return None, str(e) or e.__class__.__name__, stats
+
+
+class WorkerPool:
+    """
+    A pool of guts worker processes, replaced if a worker dies.
+
+    A worker that dies (e.g., killed for memory) breaks the pool, so the next
+    container is submitted to a new pool (with a new pull limit, as the worker
+    might have died holding a slot).
+    """
+
+    def __init__(self, workers, tmpdir, max_pulls=None):
+        self.workers = workers
+        self.tmpdir = tmpdir
+        self.max_pulls = max_pulls or workers
+        self.executor = None
+
+    def start(self):
+        semaphore = multiprocessing.Semaphore(self.max_pulls)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(self.tmpdir, semaphore),
+        )
+        return self.executor
+
+    def submit(self, func, *args):
+        """
+        Submit to the pool, starting a new one if it is broken.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        if self.executor is None:
+            self.start()
+        try:
+            return self.executor.submit(func, *args)
+        except BrokenProcessPool:
+            print("A guts worker died, starting a new pool of workers.")
+            self.executor.shutdown(wait=False)
+            return self.start().submit(func, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def iter_generate(
+    selected, workers=2, max_pulls=None, no_cleanup=False, layer_cache=None
+):
+    """
+    Generate aliases for (image, tag) with a bounded pool of worker processes.
+
+    Yields ((image, tag), (aliases, error, stats)) as each container finishes.
+    Given a layer cache (root, max_bytes), workers first try the image layers.
+    Containers in flight when a worker dies have the error worker_died.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    tmpdir = tempfile.mkdtemp(prefix="container-discovery-")
+    pool = WorkerPool(workers, tmpdir, max_pulls)
+
+    def submit(item):
+        image, tag = item
+        container = f"{image}:{tag}"
+        return pool.submit(run_worker, container, no_cleanup, layer_cache)
+
+    def on_error(item, error):
+        if not isinstance(error, BrokenProcessPool):
+            raise error
+        return None, worker_died, {}
+
+    try:
+        yield from utils.iter_completed(submit, selected, workers * 2, on_error)
+    finally:
+        pool.shutdown()
+        shutil.rmtree(tmpdir, ignore_errors=True)
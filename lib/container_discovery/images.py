@@ -0,0 +1,86 @@
+import collections
+import threading
+
+import container_discovery.guts as guts
+
+
+class ImageBudget:
+    """
+    Images pulled by a run, kept within a disk budget.
+
+    Images are kept in order of use, and when they add up to more than
+    max_bytes the least recently used are removed. Images that share layers
+    with pending work (images still being generated) are kept, so base layers
+    common to many images are not pulled again for the next one.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.images = collections.OrderedDict()
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def add(self, container, size):
+        """
+        Record that an image was pulled (or used) by the run.
+        """
+        with self.lock:
+            self.images[container] = size
+            self.images.move_to_end(container)
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def total(self):
+        return sum(self.images.values())
+
+    def refresh(self):
+        """
+        Update the size of each image, dropping those that are gone.
+
+        Guts removes an image when it finishes, so only images that failed
+        (or were not cleaned up) are usually still here.
+        """
+        with self.lock:
+            for container in list(self.images):
+                size = guts.get_image_size(container)
+                if size:
+                    self.images[container] = size
+                else:
+                    del self.images[container]
+
+    def evict(self, pending=None):
+        """
+        Remove the least recently used images until we are within the budget.
+
+        Returns the images that were removed.
+        """
+        if self.total <= self.max_bytes:
+            return []
+        self.refresh()
+        if self.total <= self.max_bytes:
+            return []
+
+        # Layers of images still being generated are kept
+        pending = set(pending or [])
+        keep = set()
+        for container in pending:
+            keep.update(guts.get_image_layers(container))
+
+        evicted = []
+        for container in list(self.images):
+            if self.total <= self.max_bytes:
+                break
+            if container in pending or keep.intersection(
+                guts.get_image_layers(container)
+            ):
+                continue
+            if guts.remove_image(container):
+                with self.lock:
+                    del self.images[container]
+                evicted.append(container)
+        self.evicted += len(evicted)
+        if evicted:
+            print(f"Evicted {len(evicted)} images, {len(self)} kept within budget.")
+        return evicted
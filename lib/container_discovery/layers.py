@@ -0,0 +1,306 @@
+import gzip
+import json
+import os
+import posixpath
+import tarfile
+import threading
+
+import container_discovery.registry as registry
+import container_discovery.utils as utils
+
+# The PATH docker sets in a container if the image doesn't have one
+default_path = "PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+# Union of the filesystems of base images, loaded once per process
+base_filesystem = None
+
+
+class LayerCache:
+    """
+    A content addressed cache of the files in image layers.
+
+    Each layer is stored by digest (e.g., sha256/<hex>.json.gz) with a listing
+    of (path, type, link target) for every member, so an image built on layers
+    we have seen only needs new layers retrieved and scanned. The cache is kept
+    under max_bytes by evicting the least recently used layers.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024**3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        utils.mkdir_p(root)
+
+    def get_path(self, digest):
+        """
+        Get the path for a layer, by digest.
+        """
+        algorithm, hexdigest = digest.split(":", 1)
+        return os.path.join(self.root, algorithm, f"{hexdigest}.json.gz")
+
+    def get(self, digest):
+        """
+        Get the listing for a layer, if we have it.
+        """
+        path = self.get_path(digest)
+        try:
+            with gzip.open(path, "rt") as fd:
+                listing = json.load(fd)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.record(hits=0, misses=1)
+            return
+        self.record(hits=1, misses=0)
+        return listing
+
+    def set(self, digest, listing):
+        """
+        Save the listing for a layer.
+        """
+        path = self.get_path(digest)
+        utils.mkdir_p(os.path.dirname(path))
+        tmpfile = f"{path}.tmp-{os.urandom(16).hex()}"
+        with gzip.open(tmpfile, "wt") as fd:
+            json.dump(listing, fd, separators=(",", ":"))
+        os.replace(tmpfile, path)
+        return listing
+
+    def record(self, hits=0, misses=0):
+        """
+        Record hits and misses (layers are retrieved by many workers).
+        """
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def prune(self):
+        """
+        Evict the least recently used layers beyond the maximum size.
+        """
+        entries = []
+        for algorithm in os.scandir(self.root):
+            if algorithm.is_dir():
+                entries += [x for x in os.scandir(algorithm.path) if x.is_file()]
+        total = sum(x.stat().st_size for x in entries)
+        if total <= self.max_bytes:
+            return 0
+        entries.sort(key=lambda x: x.stat().st_mtime)
+        evicted = 0
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+            evicted += 1
+        print(f"Evicted {evicted} layers from cache.")
+        return evicted
+
+
+def scan_layer(fileobj):
+    """
+    List the members of a layer (a tar stream, optionally compressed).
+
+    Returns a list of [path, type, target] where type is d (directory),
+    l (symbolic link) or f (anything else), and target is the link target.
+    """
+    listing = []
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            name = member.name[2:] if member.name.startswith("./") else member.name
+            path = posixpath.normpath("/" + name)
+            if member.isdir():
+                listing.append([path, "d", None])
+            elif member.issym():
+                listing.append([path, "l", member.linkname])
+            else:
+                listing.append([path, "f", None])
+    return listing
+
+
+class Filesystem:
+    """
+    A filesystem assembled from layer listings, applied in order.
+
+    Whiteouts (.wh.<name>) remove a path from lower layers, and an opaque
+    whiteout (.wh..wh..opq) removes the contents of a directory, as in an
+    extracted container.
+    """
+
+    def __init__(self):
+        self.entries = {"/": ("d", None)}
+        self.children = {"/": set()}
+
+    def add_layer(self, listing):
+        """
+        Apply a layer listing on top of the filesystem.
+        """
+        # Whiteouts apply to lower layers, so they come first
+        for path, kind, target in listing:
+            dirname, name = posixpath.split(path)
+            if name == ".wh..wh..opq":
+                for child in list(self.children.get(dirname, [])):
+                    self.remove(posixpath.join(dirname, child))
+            elif name.startswith(".wh."):
+                self.remove(posixpath.join(dirname, name[len(".wh.") :]))
+
+        for path, kind, target in listing:
+            if not posixpath.basename(path).startswith(".wh."):
+                self.add(path, kind, target)
+
+    def add(self, path, kind, target=None):
+        """
+        Add a path (and any parent directories that are missing).
+        """
+        if path == "/":
+            return
+        dirname, name = posixpath.split(path)
+        if self.entries.get(dirname, ("",))[0] != "d":
+            self.add(dirname, "d")
+
+        # A directory replaced by something else loses its contents
+        existing = self.entries.get(path)
+        if existing and existing[0] == "d" and kind != "d":
+            self.remove(path)
+        if kind == "d" and existing and existing[0] == "d":
+            return
+        self.entries[path] = (kind, target)
+        self.children[dirname].add(name)
+        if kind == "d":
+            self.children.setdefault(path, set())
+
+    def remove(self, path):
+        """
+        Remove a path and everything under it.
+        """
+        if path not in self.entries or path == "/":
+            return
+        for child in list(self.children.pop(path, [])):
+            self.remove(posixpath.join(path, child))
+        del self.entries[path]
+        dirname, name = posixpath.split(path)
+        self.children.get(dirname, set()).discard(name)
+
+    def resolve(self, path):
+        """
+        Resolve symbolic links in a path (within the filesystem), or None.
+        """
+        parts = [x for x in path.split("/") if x]
+        current = ""
+        links = 0
+        while parts:
+            name = parts.pop(0)
+            if name == ".":
+                continue
+            if name == "..":
+                current = posixpath.dirname(current).rstrip("/")
+                continue
+            following = f"{current}/{name}"
+            entry = self.entries.get(following)
+            if entry is None:
+                return
+            if entry[0] == "l":
+                links += 1
+                if links > 40:
+                    return
+                if entry[1].startswith("/"):
+                    current = ""
+                parts = [x for x in entry[1].split("/") if x] + parts
+                continue
+            current = following
+        return current or "/"
+
+    def is_dir(self, path):
+        resolved = self.resolve(path)
+        return resolved is not None and self.entries[resolved][0] == "d"
+
+    def listdir(self, path):
+        """
+        List the names in a directory, following links, or None if not found.
+        """
+        resolved = self.resolve(path)
+        if resolved is None or self.entries[resolved][0] != "d":
+            return
+        return sorted(self.children.get(resolved, []))
+
+    def iter_files(self, path="/"):
+        """
+        Yield files as a walk of the extracted filesystem would find them.
+
+        Links to directories are not files (and are not followed).
+        """
+        for name in sorted(self.children.get(path, [])):
+            child = posixpath.join(path, name)
+            kind = self.entries[child][0]
+            if kind == "d":
+                yield from self.iter_files(child)
+            elif kind != "l" or not self.is_dir(child):
+                yield child
+
+
+def get_base_filesystem():
+    """
+    Get the union of the filesystems of base images (from the guts database).
+    """
+    global base_filesystem
+    if base_filesystem is None:
+        from container_guts.main.database import Database
+
+        db = Database()
+        paths = set()
+        for data in db.iter_containers():
+            paths.update(list(data.values())[0]["fs"])
+        db.cleanup()
+        base_filesystem = paths
+    return base_filesystem
+
+
+def parse_paths(envar):
+    """
+    Parse directories from an environment variable, in the same way as guts.
+    """
+    paths = []
+    if not envar or "PATH" not in envar:
+        return paths
+    envar = envar.replace(" ", "").replace("PATH=", "").strip()
+    return [x for x in envar.split(":") if x]
+
+
+def get_unique_paths(container, cache, client=None):
+    """
+    Get paths unique to a container (not in a base image) on the PATH or
+    entrypoint, from the layers of the image.
+    """
+    client = client or registry.RegistryClient()
+    manifest = client.get_manifest(container)
+    config = client.get_config(container, manifest)
+
+    # Assemble the filesystem from cached (or new) layers
+    fs = Filesystem()
+    for layer in manifest["layers"]:
+        listing = cache.get(layer["digest"])
+        if listing is None:
+            print(f"Scanning layer {layer['digest']}")
+            response = client.get_blob(container, layer["digest"], stream=True)
+            listing = cache.set(layer["digest"], scan_layer(response.raw))
+        fs.add_layer(listing)
+
+    # Paths on the PATH, as set in the image (or by docker at runtime)
+    cfg = config.get("container_config") or config.get("config") or {}
+    env = cfg.get("Env") or []
+    if not any(x.startswith("PATH=") for x in env):
+        env = env + [default_path]
+    dirs = {path for envar in env for path in parse_paths(envar)}
+    paths = set()
+    for path in dirs:
+        paths.update(f"{path}/{x}" for x in fs.listdir(path) or [])
+
+    unique = set(fs.iter_files()).difference(get_base_filesystem())
+    entrypoint = cfg.get("Entrypoint") or []
+    return sorted(x for x in unique if x in entrypoint or x in paths)
@@ -1,21 +1,20 @@
 import os
 
-import requests
-from container_discovery.pipelines import tags_pipeline as p
+import container_discovery.pipelines as pipelines
+import container_discovery.tags as tags
 
 
-def iter_tags(containers, existing=None, registry=None):
+def iter_contenders(containers, existing=None, registry=None):
     """
-    Given a listing of containers, diff against existing and yield new tags.
+    Given a listing of containers, diff against existing and yield new images.
     """
-
     existing = existing or []
     for image in containers:
 
         # Keep original name with tag
         container = image
-        if ":" in image:
-            image, _ = image.split(":", 1)
+        if ":" in image.rsplit("/", 1)[-1]:
+            image, _ = image.rsplit(":", 1)
 
         # Look for same name in registry
         if registry and os.path.join(registry, image):
@@ -25,27 +24,47 @@ def iter_tags(containers, existing=None, registry=None):
             continue
 
         print(f"Contender image {image}")
+        yield image
 
-        print(f"Retrieving tags for {image}")
-        tags = requests.get(f"https://crane.ggcr.dev/ls/{image}")
-        tags = [x for x in tags.text.split("\n") if x]
+
+def iter_tags(
+    containers,
+    existing=None,
+    registry=None,
+    workers=1,
+    url=None,
+    cache=None,
+    client=None,
+):
+    """
+    Given a listing of containers, diff against existing and yield new tags.
+
+    Tags for contender images are retrieved with a pool of workers (and from
+    a tags.TagCache, if provided), and new tags are yielded in listing order.
+    Given a registry.RegistryClient, tags for images on the registries it
+    lists tags for are listed from the registry.
+    """
+    contenders = iter_contenders(containers, existing, registry)
+    listings = tags.iter_tags(
+        contenders, workers=workers, url=url, cache=cache, client=client
+    )
+    for image, listing in listings:
 
         # If we couldn't get tags
-        if "UNAUTHORIZED" in tags[0]:
+        if not listing or "UNAUTHORIZED" in listing[0]:
             print(f"Skipping {image}, UNAUTHORIZED in tag.")
             continue
 
-        # The updated and transformed items
+        # The latest tag, by version (a fast path, or the tags pipeline)
         try:
-            ordered = p.run(list(tags), unwrap=False)
+            tag = pipelines.select_tag(listing)
         except Exception as e:
             print(f"Ordering of tag failed: {e}")
             continue
 
         # If we aren't able to order versions.
-        if not ordered:
+        if not tag:
             print(f"No ordered tags for {image}, skipping.")
             continue
 
-        tag = ordered[0]._original
         yield f"{image}:{tag}"
@@ -1,20 +1,68 @@
 import collections
+import functools
+import hashlib
 import os
 
+import container_discovery.defaults as defaults
+import container_discovery.store as store
 import container_discovery.utils as utils
 
 
-def get_total_counts(root):
+def get_total_counts(root, workers=1, pack=None, records=None):
     """
     Given a registry root, parse json files and return a summary of total counts.
+
+    With more than one worker, the tree is split into shards (directories,
+    e.g., by letter prefix) that are counted in separate processes and merged.
+    Given a pack, the entries in the pack are counted instead. Given a list of
+    records, (alias, container, path) is added for every alias, so a reverse
+    index can be built from the same pass.
     """
-    counts = {}
+    if pack:
+        return get_packed_counts(root, pack, records)
+    if workers > 1:
+        return get_sharded_counts(root, workers, records)
 
     # Allow developer to provide tags in root
-    for filename in utils.recursive_find(os.path.join(root), ".json"):
+    filenames = utils.find_files(root, ".json")
+    counts = count_aliases(filenames, root, records)
+    return collections.OrderedDict(sorted(counts.items()))
+
+
+def add_records(records, filename, root, aliases):
+    """
+    Add (alias, container, path) records for the aliases of a cache entry.
+    """
+    container = "%s:%s" % store.parse_image_uri(filename, root)
+    records.extend((alias, container, path) for alias, path in aliases.items())
+
+
+def get_packed_counts(root, pack, records=None):
+    """
+    Count aliases across the entries of a pack.
+    """
+    counts = {}
+    packed = store.PackedCache(pack, root)
+    for filename, aliases in packed.iter_entries():
+        for alias in aliases:
+            if alias not in counts:
+                counts[alias] = 0
+            counts[alias] += 1
+        if records is not None:
+            add_records(records, filename, root, aliases)
+    packed.close()
+    return collections.OrderedDict(sorted(counts.items()))
+
+
+def count_aliases(filenames, root=None, records=None):
+    """
+    Count aliases across a listing of json files.
+    """
+    counts = {}
+    for filename in filenames:
 
         # json files at the root are not valid
-        if os.path.basename(filename) in ["skips.json", "counts.json"]:
+        if os.path.basename(filename) in defaults.reserved_files:
             print(f"Skipping {filename}")
             continue
         aliases = utils.read_json(filename)
@@ -22,5 +70,153 @@ def get_total_counts(root):
             if alias not in counts:
                 counts[alias] = 0
             counts[alias] += 1
+        if records is not None:
+            add_records(records, filename, root, aliases)
+    return counts
+
+
+def count_shard(shard, root=None, with_records=False):
+    """
+    Count aliases for a shard, either a directory to walk or a list of files.
+
+    Returns the counts, and the records for the shard if we want them.
+    """
+    records = [] if with_records else None
+    if isinstance(shard, str):
+        filenames = utils.find_files(shard, ".json")
+    else:
+        filenames = [os.path.abspath(x) for x in shard if x.endswith(".json")]
+    return count_aliases(filenames, root, records), records
+
+
+def get_shards(root, count):
+    """
+    Split a root into at least count shards to count separately.
+
+    We descend level by level (e.g., registry, then letter prefix) until there
+    are enough directories, and files found along the way are chunked into
+    shards of their own.
+    """
+    shards = [root]
+    files = []
+    while len(shards) < count:
+        subdirs = []
+        for dirname in shards:
+            with os.scandir(dirname) as entries:
+                entries = sorted(entries, key=lambda x: x.name)
+
+            # Links to directories are not followed, as in utils.find_files
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not (
+                        entry.name.startswith(".")
+                        or entry.name in defaults.skipped_dirs
+                    ):
+                        subdirs.append(entry.path)
+                elif not entry.is_dir():
+                    files.append(entry.path)
+        shards = subdirs
+        if not subdirs:
+            break
+
+    # Files are split into chunks, the remainder to fill up to the count
+    chunks = max(count - len(shards), 1)
+    size = max(-(-len(files) // chunks), 1)
+    return shards + [files[i : i + size] for i in range(0, len(files), size)]
+
+
+def get_sharded_counts(root, workers, records=None):
+    """
+    Count shards of the tree in a pool of processes, and merge the counts.
+    """
+    counts = collections.Counter()
+    shards = get_shards(os.path.join(root), workers * 4)
+    print(f"Counting {len(shards)} shards with {workers} workers")
+    from concurrent.futures import ProcessPoolExecutor
+
+    count = functools.partial(count_shard, root=root, with_records=records is not None)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial, partial_records in executor.map(count, shards):
+            counts.update(partial)
+            if records is not None:
+                records.extend(partial_records)
+    return collections.OrderedDict(sorted(counts.items()))
+
+
+def get_incremental_counts(root, state_file):
+    """
+    Given a registry root, update total counts from files changed since last run.
+
+    The state file records the hash of the content, modified time, size and
+    aliases of each file we counted, so only files that are added, removed or
+    modified are parsed. A file with the modified time and size we recorded
+    is not read, and otherwise (e.g., a fresh checkout) it is read and hashed,
+    and only parsed if the content changed. The result is the same as
+    get_total_counts, and the state is saved.
+    """
+    state = {"files": {}, "counts": {}}
+    if os.path.exists(state_file):
+        state = utils.read_json(state_file)
+    files = state["files"]
+    counts = state["counts"]
+
+    def update(aliases, change):
+        for alias in aliases:
+            counts[alias] = counts.get(alias, 0) + change
+            if not counts[alias]:
+                del counts[alias]
+
+    seen = set()
+    added, modified = 0, 0
+    for filename in utils.find_files(root, ".json"):
+
+        # json files at the root are not valid
+        if os.path.basename(filename) in defaults.reserved_files:
+            print(f"Skipping {filename}")
+            continue
+
+        relpath = os.path.relpath(filename, root)
+        seen.add(relpath)
+        stat = os.stat(filename)
+
+        # Unchanged files are not read again
+        previous = files.get(relpath)
+        if (
+            previous
+            and previous["mtime"] == stat.st_mtime_ns
+            and previous["size"] == stat.st_size
+        ):
+            continue
+
+        # Files that are only touched (e.g., checked out again) are not parsed
+        content = utils.read_file(filename, "rb")
+        digest = hashlib.sha256(content).hexdigest()
+        if previous and previous.get("sha256") == digest:
+            previous["mtime"] = stat.st_mtime_ns
+            previous["size"] = stat.st_size
+            continue
+
+        if previous:
+            update(previous["aliases"], -1)
+            modified += 1
+        else:
+            added += 1
+
+        aliases = list(utils.parse_json(content))
+        update(aliases, 1)
+        files[relpath] = {
+            "sha256": digest,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "aliases": aliases,
+        }
+
+    # Remove contributions of files that are gone
+    removed = [x for x in files if x not in seen]
+    for relpath in removed:
+        update(files.pop(relpath)["aliases"], -1)
 
+    print(f"Added {added}, modified {modified}, removed {len(removed)} files.")
+    utils.mkdir_p(os.path.dirname(os.path.abspath(state_file)))
+    utils.write_json(state, state_file, compact=True)
     return collections.OrderedDict(sorted(counts.items()))
@@ -1,13 +1,107 @@
-import pipelib.pipeline as pipeline
-import pipelib.steps as step
-
-# A pipeline to process docker tags
-steps = (
-    # Scrub commits from version string
-    step.filters.CleanCommit(),
-    # Parse versions, return sorted ascending, and taking version major.minor.patch into account
-    step.container.ContainerTagSort(),
-)
-
-# Tag parsing pipeline
-tags_pipeline = pipeline.Pipeline(steps)
+import collections
+import hashlib
+import re
+import threading
+
+# Tag parsing pipeline (pipelib is slow to import, so it is created when needed)
+tags_pipeline = None
+
+# Semantic versions (1.2.3) and conda builds (1.2.3--h123_0) we can parse directly
+version_tag = re.compile(r"([0-9]+(?:\.[0-9]+)*)(?:--[A-Za-z0-9]*_([0-9]+))?")
+has_digit = re.compile(r"\d")
+
+
+def get_tags_pipeline():
+    """
+    Get the pipeline to process docker tags, creating it the first time.
+    """
+    global tags_pipeline
+    if tags_pipeline is None:
+        import pipelib.pipeline as pipeline
+        import pipelib.steps as step
+
+        steps = (
+            # Scrub commits from version string
+            step.filters.CleanCommit(),
+            # Parse versions, return sorted ascending, and taking version major.minor.patch into account
+            step.container.ContainerTagSort(),
+        )
+        tags_pipeline = pipeline.Pipeline(steps)
+    return tags_pipeline
+
+
+def fast_select_tag(tags):
+    """
+    Select the latest tag in one pass, if every tag is a version we understand.
+
+    This gives the same tag as the pipeline: CleanCommit turns 1.2.3--h123_0
+    into 1.2.3.0, ContainerTagSort keeps versions with at least a major, minor
+    and patch, and the first of the largest (in listing order) is the latest.
+    Tags without any digits have no version and are ignored. Returns a tuple
+    (handled, tag), and handled is False if the pipeline is needed.
+    """
+    selected = None
+    latest = None
+    for tag in tags:
+        match = version_tag.fullmatch(tag)
+        if not match:
+            if has_digit.search(tag):
+                return False, None
+            continue
+        version = [int(x) for x in match.group(1).split(".")]
+        if match.group(2) is not None:
+            version.append(int(match.group(2)))
+        if len(version) >= 3 and (latest is None or version > latest):
+            selected, latest = tag, version
+    return True, selected
+
+
+class TagSelector:
+    """
+    Select the latest tag from a listing, with a memo keyed by the listing.
+
+    Listings of versions we understand are handled in one pass, and anything
+    else falls back to the full tags pipeline. The memo keeps the selected tag
+    for the most recent max_entries listings (keyed by a hash of the listing).
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.memo = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_key(self, tags):
+        return hashlib.sha256("\n".join(tags).encode("utf-8")).hexdigest()
+
+    def select(self, tags):
+        """
+        Get the latest tag from a listing, or None if there isn't one.
+        """
+        tags = list(tags)
+        key = self.get_key(tags)
+        with self.lock:
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                return self.memo[key]
+
+        handled, tag = fast_select_tag(tags)
+        if not handled:
+            ordered = get_tags_pipeline().run(tags, unwrap=False)
+            tag = ordered[0]._original if ordered else None
+
+        with self.lock:
+            self.memo[key] = tag
+            if len(self.memo) > self.max_entries:
+                self.memo.popitem(last=False)
+        return tag
+
+
+# Shared selector, so the memo is shared across callers
+tag_selector = TagSelector()
+
+
+def select_tag(tags):
+    """
+    Get the latest tag from a listing of tags, or None if there isn't one.
+    """
+    return tag_selector.select(tags)
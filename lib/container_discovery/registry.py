@@ -0,0 +1,272 @@
+import hashlib
+import re
+import threading
+import time
+import urllib.parse
+
+# Docker Hub images are served from a different host than the name
+docker_hub = "registry-1.docker.io"
+
+# Manifests we accept, single platform or index (list)
+manifest_types = [
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+]
+index_types = [
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+]
+
+# Seconds a token is kept for when a token service doesn't say (as in the spec),
+# and how long before it expires we ask for another
+token_expires = 60
+token_margin = 10
+
+# Seconds to wait for a registry (or token service) to respond
+timeout = 30
+
+
+def parse_image(image):
+    """
+    Parse an image into (registry, repository, reference).
+
+    The registry is the host to make requests to, and the reference is a tag
+    (defaults to latest) or digest.
+    """
+    reference = "latest"
+    if "@" in image:
+        image, reference = image.split("@", 1)
+    elif ":" in image.rsplit("/", 1)[-1]:
+        image, reference = image.rsplit(":", 1)
+
+    parts = image.split("/")
+    host = parts[0]
+    if len(parts) > 1 and ("." in host or ":" in host or host == "localhost"):
+        registry, repository = parts[0], "/".join(parts[1:])
+    else:
+        registry, repository = "docker.io", image
+    if registry == "docker.io":
+        registry = docker_hub
+        if "/" not in repository:
+            repository = f"library/{repository}"
+    return registry, repository, reference
+
+
+def get_scheme(registry):
+    """
+    Local registries (e.g., for testing) are served over http.
+    """
+    host = registry.split(":", 1)[0]
+    return "http" if host in ["localhost", "127.0.0.1"] else "https"
+
+
+def get_session(workers=1, hosts=10):
+    """
+    Get a requests session with a pool of connections for each host.
+
+    Each host (a registry, or its token service) keeps up to workers
+    connections alive, for the pools of the most recent hosts.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=max(workers, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def parse_challenge(header):
+    """
+    Parse a WWW-Authenticate Bearer challenge into a dict (realm, service, scope).
+    """
+    return dict(re.findall(r'(\w+)="([^"]*)"', header or ""))
+
+
+class RegistryClient:
+    """
+    A small client for the registry v2 API, with anonymous (bearer) tokens.
+
+    Tokens are kept for each registry and scope until they expire, so requests
+    for the same repository only ask for a token once. The challenge from a
+    registry is kept too, so a token for another repository is asked for
+    without being challenged again. Tags are listed from the registry (instead
+    of the tags url) for images on tag_registries, e.g., quay.io, or "*" for
+    any registry. Requests wait up to timeout seconds for a response.
+    """
+
+    def __init__(
+        self,
+        session=None,
+        workers=1,
+        tag_registries=None,
+        page_size=None,
+        timeout=timeout,
+    ):
+        self.session = session or get_session(workers)
+        self.tag_registries = set(tag_registries or [])
+        self.page_size = page_size
+        self.timeout = timeout
+        self.tokens = {}
+        self.challenges = {}
+        self.lock = threading.Lock()
+
+    def get_url(self, registry, repository, path):
+        """
+        Get the url for a path of a repository (a url, e.g., a next page, is kept).
+        """
+        if "://" in path:
+            return path
+        return f"{get_scheme(registry)}://{registry}/v2/{repository}/{path}"
+
+    def get_cached_token(self, registry, scope):
+        """
+        Get a token we have for a registry and scope, if it hasn't expired.
+        """
+        with self.lock:
+            token, expires = self.tokens.get((registry, scope), (None, 0))
+        if time.time() < expires:
+            return token
+
+    def get_token(self, registry, challenge):
+        """
+        Get a token for a challenge from the realm, and keep it for the scope.
+        """
+        params = {k: v for k, v in challenge.items() if k in ["service", "scope"]}
+        response = self.session.get(
+            challenge["realm"], params=params, timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        token = data.get("token") or data.get("access_token")
+        expires_in = data.get("expires_in") or token_expires
+        expires = time.time() + max(expires_in - token_margin, 0)
+        with self.lock:
+            self.tokens[(registry, challenge.get("scope"))] = (token, expires)
+        return token
+
+    def request(self, method, registry, repository, path, headers=None, **kwargs):
+        """
+        Make a request to the registry, authenticating if we are challenged.
+        """
+        url = self.get_url(registry, repository, path)
+        headers = dict(headers or {})
+        kwargs.setdefault("timeout", self.timeout)
+        scope = f"repository:{repository}:pull"
+        token = self.get_cached_token(registry, scope)
+        challenge = self.challenges.get(registry)
+        if not token and challenge:
+            token = self.get_token(registry, dict(challenge, scope=scope))
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        if response.status_code == 401:
+            challenge = parse_challenge(response.headers.get("WWW-Authenticate"))
+            if "realm" not in challenge:
+                response.raise_for_status()
+            challenge.setdefault("scope", scope)
+            with self.lock:
+                self.challenges[registry] = challenge
+            token = self.get_token(registry, challenge)
+            headers["Authorization"] = f"Bearer {token}"
+            response = self.session.request(method, url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def lists_tags(self, image):
+        """
+        Determine if we list tags for an image from its registry.
+        """
+        if not self.tag_registries:
+            return False
+        registry = parse_image(image)[0]
+        if registry == docker_hub:
+            registry = "docker.io"
+        return "*" in self.tag_registries or registry in self.tag_registries
+
+    def get_tags(self, image):
+        """
+        List the tags for an image, following the Link to each next page.
+        """
+        registry, repository, _ = parse_image(image)
+        params = {"n": self.page_size} if self.page_size else None
+        path = "tags/list"
+        tags = []
+        while path:
+            response = self.request("GET", registry, repository, path, params=params)
+            tags += response.json().get("tags") or []
+
+            # The next page is relative to this one, and has the query we need
+            link = response.links.get("next", {}).get("url")
+            path = urllib.parse.urljoin(response.url, link) if link else None
+            params = None
+        return tags
+
+    def get_manifest(self, image, platform="linux/amd64"):
+        """
+        Get the manifest for an image, choosing a platform from an index.
+        """
+        registry, repository, reference = parse_image(image)
+        headers = {"Accept": ", ".join(manifest_types + index_types)}
+        manifest = self.request(
+            "GET", registry, repository, f"manifests/{reference}", headers=headers
+        ).json()
+        if manifest.get("mediaType") not in index_types and "manifests" not in manifest:
+            return manifest
+
+        # Choose the platform we want (or the first)
+        os_name, arch = platform.split("/", 1)
+        choices = manifest.get("manifests") or []
+        chosen = next(
+            (
+                x
+                for x in choices
+                if x.get("platform", {}).get("os") == os_name
+                and x.get("platform", {}).get("architecture") == arch
+            ),
+            choices[0] if choices else None,
+        )
+        if chosen is None:
+            raise ValueError(f"No manifests found for {image}")
+        return self.request(
+            "GET",
+            registry,
+            repository,
+            f"manifests/{chosen['digest']}",
+            headers={"Accept": ", ".join(manifest_types)},
+        ).json()
+
+    def get_digest(self, image):
+        """
+        Get the digest of the manifest for an image (a tag or digest).
+
+        The registry gives it in a header for a HEAD request, and otherwise it
+        is the digest of the manifest we retrieve.
+        """
+        registry, repository, reference = parse_image(image)
+        if reference.startswith("sha256:"):
+            return reference
+        headers = {"Accept": ", ".join(manifest_types + index_types)}
+        path = f"manifests/{reference}"
+        response = self.request("HEAD", registry, repository, path, headers=headers)
+        digest = response.headers.get("Docker-Content-Digest")
+        if digest:
+            return digest
+        response = self.request("GET", registry, repository, path, headers=headers)
+        return "sha256:" + hashlib.sha256(response.content).hexdigest()
+
+    def get_blob(self, image, digest, stream=False):
+        """
+        Get a blob (e.g., a config or layer) for an image.
+        """
+        registry, repository, _ = parse_image(image)
+        return self.request(
+            "GET", registry, repository, f"blobs/{digest}", stream=stream
+        )
+
+    def get_config(self, image, manifest):
+        """
+        Get the image config for a manifest.
+        """
+        return self.get_blob(image, manifest["config"]["digest"]).json()
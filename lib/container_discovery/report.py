@@ -0,0 +1,241 @@
+import collections
+import contextlib
+import threading
+import time
+
+import container_discovery.utils as utils
+
+# Phases of update-cache we time for each image
+phases = ["tags", "order", "digest", "layers", "pull", "guts", "write", "cleanup"]
+
+
+class RunReport:
+    """
+    Timings and counters for an update-cache run.
+
+    Each phase is timed for each image, and counters are kept for the run
+    (images by status, skips by reason, bytes pulled, and alias and tag cache
+    hits).
+    For a streaming run, the depth of the queue after each stage is sampled.
+    Hooks are functions called with (image, phase) that return a context
+    manager to wrap the phase, e.g., to attach a profiler.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self.images = collections.OrderedDict()
+        self.counters = collections.Counter()
+        self.skips = collections.Counter()
+        self.phases = collections.Counter()
+        self.queues = {}
+        self.started = time.time()
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def get_image(self, image):
+        """
+        Get the record for an image (with timings for each phase).
+        """
+        if image not in self.images:
+            self.images[image] = {"phases": {}}
+        return self.images[image]
+
+    def add_time(self, image, phase, seconds):
+        """
+        Add time spent in a phase for an image.
+        """
+        with self.lock:
+            timings = self.get_image(image)["phases"]
+            timings[phase] = timings.get(phase, 0) + seconds
+            self.phases[phase] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, image, phase):
+        """
+        Time a phase for an image, running any hooks around it.
+        """
+        with contextlib.ExitStack() as stack:
+            for hook in self.hooks:
+                stack.enter_context(hook(image, phase))
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.add_time(image, phase, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """
+        Increment a counter for the run.
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def set_status(self, image, status, **kwargs):
+        """
+        Set the status of an image (e.g., generated, cached, skipped, failed).
+        """
+        with self.lock:
+            record = self.get_image(image)
+            record["status"] = status
+            record.update(kwargs)
+
+    def skip(self, image, reason):
+        """
+        Record that an image was skipped, and why.
+        """
+        self.set_status(image, "skipped", reason=reason)
+        with self.lock:
+            self.skips[reason] += 1
+
+    def sample_queue(self, stage, depth):
+        """
+        Sample the depth of the queue after a stage of a streaming run.
+        """
+        with self.lock:
+            queue = self.queues.setdefault(stage, {"max": 0, "total": 0, "samples": 0})
+            queue["max"] = max(queue["max"], depth)
+            queue["total"] += depth
+            queue["samples"] += 1
+
+    def finish(self, tag_cache=None):
+        """
+        Finish the run, adding counts from the tag cache if we have one.
+        """
+        self.finished = time.time()
+        if tag_cache is not None:
+            self.counters["tag_cache_hits"] = tag_cache.hits
+            self.counters["tag_cache_misses"] = tag_cache.misses
+
+    @property
+    def seconds(self):
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self):
+        """
+        Get the report as a dictionary, for a json report.
+        """
+        statuses = collections.Counter(
+            x["status"] for x in self.images.values() if "status" in x
+        )
+        processed = sum(statuses.values())
+        return {
+            "started": self.started,
+            "finished": self.finished,
+            "seconds": self.seconds,
+            "images_per_minute": processed / self.seconds * 60 if self.seconds else 0,
+            "statuses": dict(statuses),
+            "skips": dict(self.skips),
+            "counters": dict(self.counters),
+            "phases": {x: self.phases[x] for x in phases if x in self.phases},
+            "queues": {
+                name: {"max": x["max"], "mean": x["total"] / x["samples"]}
+                for name, x in self.queues.items()
+            },
+            "images": self.images,
+        }
+
+    def save(self, filename):
+        """
+        Save the report as json.
+        """
+        utils.write_json(self.to_dict(), filename)
+
+    def to_prometheus(self, prefix="container_discovery"):
+        """
+        Get the run counters in the Prometheus text exposition format.
+        """
+        report = self.to_dict()
+        lines = []
+
+        def add(name, kind, help, samples):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        add(
+            "phase_seconds_total",
+            "counter",
+            "Seconds spent in each phase.",
+            [('{phase="%s"}' % k, v) for k, v in report["phases"].items()],
+        )
+        add(
+            "images_total",
+            "counter",
+            "Images processed by status.",
+            [('{status="%s"}' % k, v) for k, v in report["statuses"].items()],
+        )
+        add(
+            "skips_total",
+            "counter",
+            "Images skipped by reason.",
+            [('{reason="%s"}' % k, v) for k, v in report["skips"].items()],
+        )
+        add(
+            "alias_cache_total",
+            "counter",
+            "Images in the listing with an entry (hit) or without (miss).",
+            [
+                ('{result="hit"}', self.counters["alias_cache_hits"]),
+                ('{result="miss"}', self.counters["alias_cache_misses"]),
+            ],
+        )
+        add(
+            "tag_cache_total",
+            "counter",
+            "Tag listings from the cache (hit) or retrieved (miss).",
+            [
+                ('{result="hit"}', self.counters["tag_cache_hits"]),
+                ('{result="miss"}', self.counters["tag_cache_misses"]),
+            ],
+        )
+        add(
+            "pulled_bytes_total",
+            "counter",
+            "Bytes of images pulled.",
+            [("", self.counters["pulled_bytes"])],
+        )
+        add(
+            "queue_depth_max",
+            "gauge",
+            "Most items waiting after each stage of a streaming run.",
+            [('{stage="%s"}' % k, v["max"]) for k, v in report["queues"].items()],
+        )
+        add(
+            "queue_depth_mean",
+            "gauge",
+            "Mean items waiting after each stage of a streaming run.",
+            [('{stage="%s"}' % k, v["mean"]) for k, v in report["queues"].items()],
+        )
+        add("run_seconds", "gauge", "Seconds of the run.", [("", report["seconds"])])
+        add(
+            "images_per_minute",
+            "gauge",
+            "Images processed per minute.",
+            [("", report["images_per_minute"])],
+        )
+        add(
+            "finished_timestamp_seconds",
+            "gauge",
+            "When the run finished.",
+            [("", self.finished or 0)],
+        )
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, filename):
+        """
+        Save counters to a Prometheus textfile (replaced atomically for a collector).
+        """
+        utils.write_file(self.to_prometheus(), filename)
+
+
+def time_phase(report, image, phase):
+    """
+    Time a phase with a report, or do nothing if we don't have one.
+    """
+    if report is None:
+        return contextlib.nullcontext()
+    return report.timer(image, phase)
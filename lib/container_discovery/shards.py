@@ -0,0 +1,153 @@
+import glob
+import hashlib
+import os
+import shutil
+
+import container_discovery.defaults as defaults
+import container_discovery.digests as digestmap
+import container_discovery.skips as skiplist
+import container_discovery.utils as utils
+
+
+def parse_shard(shard):
+    """
+    Parse a shard "i/N" into (index, count), where 0 <= i < N.
+    """
+    try:
+        index, count = [int(x) for x in shard.split("/")]
+    except ValueError:
+        raise ValueError(f"Shard {shard} must be formatted as i/N, e.g., 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard {shard} must have 0 <= i < N")
+    return index, count
+
+
+def get_shard(image, count):
+    """
+    Get the shard for an image (without tag) from a stable hash of the name.
+
+    The same image always goes to the same shard (regardless of the order of
+    the listing, or the run), so shards are disjoint. Only the last part of
+    the name can have a tag, so a registry with a port (e.g., localhost:5000)
+    is kept.
+    """
+    if ":" in image.rsplit("/", 1)[-1]:
+        image, _ = image.rsplit(":", 1)
+    digest = hashlib.sha1(image.encode("utf-8")).hexdigest()
+    return int(digest, 16) % count
+
+
+def filter_shard(containers, index, count):
+    """
+    Filter a listing of containers to those in a shard.
+    """
+    return [x for x in containers if get_shard(x, count) == index]
+
+
+def get_skips_file(root, index, count):
+    """
+    Get the skips file for a shard, in the state directory under the root.
+    """
+    return os.path.join(root, defaults.state_dir, f"skips-{index}-of-{count}.json")
+
+
+def get_digests_file(root, index, count):
+    """
+    Get the digests file for a shard, in the state directory under the root.
+    """
+    return os.path.join(root, defaults.state_dir, f"digests-{index}-of-{count}.json")
+
+
+def iter_shard_digests(root):
+    """
+    Yield digests files (from the default and from any shards) under a root.
+    """
+    yield os.path.join(root, defaults.state_dir, "digests.json")
+    pattern = os.path.join(root, defaults.state_dir, "digests-*-of-*.json")
+    yield from sorted(glob.glob(pattern))
+
+
+def iter_shard_skips(root):
+    """
+    Yield skips files (from the default and from any shards) under a root.
+
+    A shard that was interrupted can have a journal without a skips file.
+    """
+    yield os.path.join(root, "skips.json")
+    found = set()
+    for ext in [".json", ".journal"]:
+        pattern = os.path.join(root, defaults.state_dir, f"skips-*-of-*{ext}")
+        found.update(os.path.splitext(x)[0] + ".json" for x in glob.glob(pattern))
+    yield from sorted(found)
+
+
+def merge_shards(root, shard_roots=None):
+    """
+    Merge the skips and new entries of shards into a cache root.
+
+    Shards run in the same root (on a shared filesystem) only need their skips
+    (and digests) merged. For shards run elsewhere, entries are copied into the
+    same layout, and an entry that exists with different aliases is reported as
+    a conflict (and the existing entry is kept). Returns (copied, conflicts).
+    """
+    root = os.path.abspath(root)
+    shard_roots = [os.path.abspath(x) for x in shard_roots or []]
+
+    # Union the skips of the root and all shards
+    skips = skiplist.SkipsJournal(os.path.join(root, "skips.json"))
+    merged = []
+    for shard_root in [root] + shard_roots:
+        for skips_file in iter_shard_skips(shard_root):
+            journal = skiplist.get_journal(skips_file)
+            if not os.path.exists(skips_file) and not os.path.exists(journal):
+                continue
+            for image in skiplist.SkipsJournal(skips_file):
+                skips.add(image)
+            if shard_root == root and os.path.basename(skips_file) != "skips.json":
+                merged += [skips_file, journal]
+    skips.close()
+    print(f"Merged {len(skips)} skips into {skips.skips_file}")
+
+    # The shard skips (and journals) in the root are now in skips.json
+    for skips_file in merged:
+        if os.path.exists(skips_file):
+            os.remove(skips_file)
+
+    # Union the digests of entries (entries are relative to each root)
+    digests = digestmap.DigestMap(
+        os.path.join(root, defaults.state_dir, "digests.json"), root
+    )
+    merged = []
+    for shard_root in [root] + shard_roots:
+        for digests_file in iter_shard_digests(shard_root):
+            if digests_file == digests.filename or not os.path.exists(digests_file):
+                continue
+            count = len(digests)
+            digests.load(digests_file)
+            digests.changed = digests.changed or len(digests) > count
+            if shard_root == root:
+                merged.append(digests_file)
+    digests.save()
+    print(f"Merged {len(digests)} digests into {digests.filename}")
+    for digests_file in merged:
+        os.remove(digests_file)
+
+    # Copy new entries from shards run elsewhere
+    copied = 0
+    conflicts = []
+    for shard_root in shard_roots:
+        if shard_root == root:
+            continue
+        for filename in utils.find_files(shard_root, ".json"):
+            if os.path.basename(filename) in defaults.reserved_files:
+                continue
+            dest = os.path.join(root, os.path.relpath(filename, shard_root))
+            if not os.path.exists(dest):
+                utils.mkdir_p(os.path.dirname(dest))
+                shutil.copyfile(filename, dest)
+                copied += 1
+            elif utils.read_json(dest) != utils.read_json(filename):
+                print(f"Conflict for {dest}, keeping existing entry.")
+                conflicts.append(dest)
+    print(f"Copied {copied} entries with {len(conflicts)} conflicts.")
+    return copied, conflicts
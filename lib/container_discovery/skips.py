@@ -0,0 +1,134 @@
+import os
+import threading
+
+import container_discovery.defaults as defaults
+import container_discovery.utils as utils
+
+
+def get_journal(skips_file):
+    """
+    Get the journal for a skips file, in the state directory next to it.
+
+    The state directory is not committed (it is kept between runs by the
+    action), so an interrupted run keeps its journal.
+    """
+    dirname, basename = os.path.split(os.path.abspath(skips_file))
+    if os.path.basename(dirname) != defaults.state_dir:
+        dirname = os.path.join(dirname, defaults.state_dir)
+    return os.path.join(dirname, os.path.splitext(basename)[0] + ".journal")
+
+
+class SkipsJournal:
+    """
+    A set of images to skip, with additions appended to a journal.
+
+    Rewriting the sorted skips.json for every image gets slower as it grows, so
+    each new skip is appended to a journal (e.g., skips.journal in the state
+    directory next to the skips file) and flushed, with an fsync every
+    batch_size additions. The journal is compacted into the sorted skips file
+    when it reaches max_journal lines and on close, and loading merges both so
+    a resumed run sees all skips.
+    """
+
+    def __init__(self, skips_file, batch_size=64, max_journal=10000):
+        self.skips_file = skips_file
+        self.journal = get_journal(skips_file)
+        self.batch_size = batch_size
+        self.max_journal = max_journal
+        self.skips = set()
+        self.journaled = 0
+        self.pending = 0
+        self.fd = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Load skips from the skips file and any journal left by a previous run.
+        """
+        if os.path.exists(self.skips_file):
+            self.skips.update(utils.read_json(self.skips_file))
+        if not os.path.exists(self.journal):
+            return
+        lines = utils.read_lines(self.journal)
+        self.skips.update(x for x in lines if x)
+        self.journaled = len(lines)
+
+    def update(self, images):
+        """
+        Add images to skip that are already saved elsewhere, without a journal.
+        """
+        with self.lock:
+            self.skips.update(images)
+
+    def open(self):
+        """
+        Open the journal to append, if it isn't open.
+        """
+        if self.fd is None:
+            utils.mkdir_p(os.path.dirname(os.path.abspath(self.journal)))
+            self.fd = open(self.journal, "a")
+        return self.fd
+
+    def add(self, image):
+        """
+        Add an image to skip, appending it to the journal.
+        """
+        with self.lock:
+            if self.closed:
+                raise ValueError(f"Skips journal {self.journal} is closed.")
+            if image in self.skips:
+                return
+            self.skips.add(image)
+            fd = self.open()
+            fd.write(image + "\n")
+            fd.flush()
+            self.journaled += 1
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.sync()
+            if self.journaled >= self.max_journal:
+                self.compact()
+
+    def sync(self):
+        """
+        Sync appended skips to disk.
+        """
+        if self.fd is not None and self.pending:
+            self.fd.flush()
+            os.fsync(self.fd.fileno())
+        self.pending = 0
+
+    def compact(self):
+        """
+        Write all skips to the sorted skips file, and empty the journal.
+
+        The skips file is replaced atomically before the journal is removed, so
+        an interruption between the two only leaves skips we already have.
+        """
+        self.sync()
+        utils.write_json(sorted(self.skips), self.skips_file)
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+        self.journaled = 0
+
+    def close(self):
+        """
+        Compact the journal at the end of a run (and accept no more skips).
+        """
+        with self.lock:
+            self.compact()
+            self.closed = True
+
+    def __contains__(self, image):
+        return image in self.skips
+
+    def __iter__(self):
+        return iter(self.skips)
+
+    def __len__(self):
+        return len(self.skips)
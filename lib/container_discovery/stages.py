@@ -0,0 +1,138 @@
+import queue
+import threading
+
+# Marks the end of the items a stage yields
+finished = object()
+
+
+class Stage:
+    """
+    A stage of a pipeline, and the bounded queue of results it yields.
+
+    The function takes an iterator of items (the results of the stage before)
+    and yields results, e.g., iter_listings, so a stage keeps any concurrency
+    of its own (threads, or a pool of processes).
+    """
+
+    def __init__(self, name, func, maxsize):
+        self.name = name
+        self.func = func
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+
+class Pipeline:
+    """
+    A streaming pipeline, with each stage in a thread and a bounded queue
+    between stages.
+
+    A stage waits when the queue of its results is full, so a slow stage
+    applies backpressure to the stages before it instead of their results
+    being buffered without bound. The depth of each queue can be sampled while
+    the pipeline runs, and is sampled to a report.RunReport (if provided) each
+    time a stage yields. An error in a stage stops the pipeline, and is raised
+    to the consumer once the stage threads have finished (waiting up to
+    timeout seconds for each).
+    """
+
+    def __init__(self, maxsize=16, report=None, poll=0.1, timeout=60):
+        self.maxsize = maxsize
+        self.report = report
+        self.poll = poll
+        self.timeout = timeout
+        self.stages = []
+        self.stopped = threading.Event()
+        self.error = None
+
+    def add_stage(self, name, func, maxsize=None):
+        """
+        Add a stage, a function from an iterator of items to an iterator of results.
+        """
+        self.stages.append(Stage(name, func, maxsize or self.maxsize))
+        return self
+
+    def depths(self):
+        """
+        Get the current depth of the queue after each stage.
+        """
+        return {stage.name: stage.depth for stage in self.stages}
+
+    def put(self, stage, item):
+        """
+        Put an item on the queue of a stage, unless the pipeline is stopped.
+        """
+        while not self.stopped.is_set():
+            try:
+                stage.queue.put(item, timeout=self.poll)
+            except queue.Full:
+                continue
+            if self.report is not None and item is not finished:
+                self.report.sample_queue(stage.name, stage.depth)
+            return True
+        return False
+
+    def iter_queue(self, stage):
+        """
+        Yield the results of a stage until it finishes (or the pipeline stops).
+        """
+        while True:
+            try:
+                item = stage.queue.get(timeout=self.poll)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return
+                continue
+            if item is finished:
+                return
+            yield item
+
+    def run_stage(self, stage, items):
+        try:
+            for result in stage.func(items):
+                if not self.put(stage, result):
+                    return
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            self.stopped.set()
+        finally:
+            self.put(stage, finished)
+
+    def run(self, items):
+        """
+        Run items through the stages, and yield the results of the last.
+        """
+        for stage in self.stages:
+            stage.thread = threading.Thread(
+                target=self.run_stage,
+                args=(stage, items),
+                name=f"stage-{stage.name}",
+                daemon=True,
+            )
+            stage.thread.start()
+            items = self.iter_queue(stage)
+
+        try:
+            yield from items
+        finally:
+            # Stages still running (e.g., we were interrupted) are stopped, and
+            # finish before the consumer closes anything they write to
+            self.stopped.set()
+            self.join()
+        if self.error is not None:
+            raise self.error
+
+    def join(self):
+        """
+        Wait for the stage threads to finish.
+        """
+        for stage in self.stages:
+            if stage.thread is None:
+                continue
+            stage.thread.join(self.timeout)
+            if stage.thread.is_alive():
+                print(f"Stage {stage.name} did not finish within {self.timeout}s.")
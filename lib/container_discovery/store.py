@@ -0,0 +1,254 @@
+import os
+import threading
+
+import container_discovery.defaults as defaults
+import container_discovery.utils as utils
+
+
+def get_prefix(filename):
+    """
+    Get the prefix for a cache entry, i.e., the path to <repo>:<tag>.json
+    without the tag and extension.
+    """
+    dirname, basename = os.path.split(filename)
+    name = basename.split(":", 1)[0]
+    if name.endswith(".json"):
+        name = name[: -len(".json")]
+    return os.path.join(dirname, name)
+
+
+def parse_image_uri(filename, root):
+    """
+    Parse the image and tag from the path of a cache entry.
+
+    Given the stated pattern to store a letter, remove it.
+    """
+    # Get the path relative to root
+    registry_uri = os.path.relpath(filename, root)
+
+    # Remove any likely prefix
+    parts = registry_uri.split(os.sep)
+    parsed = []
+    for i, part in enumerate(parts):
+        if len(part) == 1 and i + 1 < len(parts):
+            if parts[i + 1][0] == part:
+                continue
+        parsed.append(part)
+    registry_uri = os.sep.join(parsed)
+
+    # We really only need the container uri,
+    image, tag = registry_uri.replace(".json", "").split(":", 1)
+    return image, tag
+
+
+class CacheIndex:
+    """
+    An in-memory index of cache entries, keyed by cache prefix.
+
+    The cache root is walked once, and each entry is indexed under the prefix
+    from get_cache_prefix (the path without the tag and extension) so we can
+    check for entries without a glob of the filesystem per image.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """
+        Walk the cache root and index every cache entry.
+        """
+        for filename in utils.find_files(self.root, ".json"):
+            if os.path.basename(filename) in defaults.reserved_files:
+                continue
+            self.add(filename)
+
+    def add(self, filename):
+        """
+        Add a cache entry to the index.
+        """
+        filename = os.path.abspath(filename)
+        entries = self.entries.setdefault(get_prefix(filename), [])
+        if filename not in entries:
+            entries.append(filename)
+            entries.sort()
+
+    def has_prefix(self, prefix):
+        """
+        Determine if we have an entry for a prefix (for any tag).
+        """
+        return os.path.abspath(prefix) in self.entries
+
+    def search_prefix(self, prefix):
+        """
+        Get entries for a prefix (for any tag).
+        """
+        return list(self.entries.get(os.path.abspath(prefix), []))
+
+    def read(self, filename):
+        """
+        Read the aliases for a cache entry.
+        """
+        return utils.read_json(filename)
+
+    def write(self, filename, aliases):
+        """
+        Write the aliases for a cache entry, and add it to the index.
+        """
+        utils.mkdir_p(os.path.dirname(filename))
+        utils.write_json(aliases, filename)
+        self.add(filename)
+
+    def __contains__(self, filename):
+        filename = os.path.abspath(filename)
+        return filename in self.entries.get(get_prefix(filename), [])
+
+    def __len__(self):
+        return sum(len(x) for x in self.entries.values())
+
+
+class PackedCache:
+    """
+    A packed cache, with every entry in a single SQLite file.
+
+    Entries are keyed by their path in the directory layout (relative to the
+    cache root), and indexed by prefix, so lookups by image are O(log n) and
+    the same functions can use either a directory or a pack. The connection
+    is shared by the threads of a streaming run, one query at a time.
+    """
+
+    def __init__(self, filename, root):
+        self.filename = filename
+        import sqlite3
+
+        self.root = os.path.abspath(root)
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(path TEXT PRIMARY KEY, prefix TEXT NOT NULL, aliases TEXT NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_prefix ON entries (prefix)"
+            )
+
+    def get_key(self, filename):
+        """
+        Get the key for a filename (or prefix), the path relative to the root.
+        """
+        return os.path.relpath(os.path.abspath(filename), self.root)
+
+    def get_path(self, key):
+        """
+        Get the filename in the directory layout for a key.
+        """
+        return os.path.join(self.root, key)
+
+    def has_prefix(self, prefix):
+        """
+        Determine if we have an entry for a prefix (for any tag).
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM entries WHERE prefix = ? LIMIT 1",
+                (self.get_key(prefix),),
+            ).fetchone()
+        return row is not None
+
+    def search_prefix(self, prefix):
+        """
+        Get entries for a prefix (for any tag).
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT path FROM entries WHERE prefix = ? ORDER BY path",
+                (self.get_key(prefix),),
+            ).fetchall()
+        return [self.get_path(x[0]) for x in rows]
+
+    def read(self, filename):
+        """
+        Read the aliases for a cache entry.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT aliases FROM entries WHERE path = ?", (self.get_key(filename),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(filename)
+        return utils.parse_json(row[0])
+
+    def write(self, filename, aliases):
+        """
+        Write the aliases for a cache entry.
+        """
+        self.write_entries([(filename, aliases)])
+
+    def write_entries(self, entries):
+        """
+        Write (filename, aliases) for many entries in one transaction.
+        """
+        rows = []
+        for filename, aliases in entries:
+            key = self.get_key(filename)
+            data = utils.print_json(aliases, compact=True)
+            rows.append((key, get_prefix(key), data))
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries (path, prefix, aliases) VALUES (?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def iter_entries(self):
+        """
+        Yield (filename, aliases) for every entry, ordered by path.
+        """
+        for key, aliases in self.db.execute(
+            "SELECT path, aliases FROM entries ORDER BY path"
+        ):
+            yield self.get_path(key), utils.parse_json(aliases)
+
+    def close(self):
+        self.db.close()
+
+    def __contains__(self, filename):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM entries WHERE path = ?", (self.get_key(filename),)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def import_pack(root, pack):
+    """
+    Import the entries of a cache directory into a pack.
+    """
+    packed = PackedCache(pack, root)
+    count = packed.write_entries(
+        (filename, utils.read_json(filename))
+        for filename in utils.find_files(root, ".json")
+        if os.path.basename(filename) not in defaults.reserved_files
+    )
+    packed.close()
+    return count
+
+
+def export_pack(root, pack):
+    """
+    Export the entries of a pack into a cache directory.
+    """
+    packed = PackedCache(pack, root)
+    count = 0
+    for filename, aliases in packed.iter_entries():
+        utils.mkdir_p(os.path.dirname(filename))
+        utils.write_json(aliases, filename)
+        count += 1
+    packed.close()
+    return count
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import threading
+import time
+
+import container_discovery.utils as utils
+
+# Default endpoint to list tags, formatted with the image
+crane_url = "https://crane.ggcr.dev/ls/{image}"
+
+# Registry responses for a listing we will not get on another run
+refused_statuses = [401, 403, 404]
+
+
+class TagCache:
+    """
+    A persistent cache of tag listings, with one file per image.
+
+    Each entry stores the raw listing, when it was fetched, and any validators
+    (ETag and Last-Modified) so a stale entry can be revalidated. Entries are
+    fresh for ttl seconds, and the least recently used are evicted beyond
+    max_entries.
+    """
+
+    def __init__(self, root, ttl=86400, max_entries=100000, refresh=False):
+        self.root = root
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        utils.mkdir_p(root)
+
+    def get_path(self, image):
+        """
+        Get the path to the entry for an image.
+        """
+        digest = hashlib.sha256(image.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{digest}.json")
+
+    def get(self, image):
+        """
+        Get the entry for an image, if we have one.
+        """
+        path = self.get_path(image)
+        if not os.path.exists(path):
+            return
+        try:
+            return utils.read_json(path)
+        except ValueError:
+            return
+
+    def is_fresh(self, entry):
+        """
+        Determine if an entry is within the ttl (and we are not refreshing).
+        """
+        return not self.refresh and time.time() - entry["fetched"] < self.ttl
+
+    def touch(self, image):
+        """
+        Mark an entry as recently used, so it is evicted last.
+        """
+        try:
+            os.utime(self.get_path(image))
+        except OSError:
+            pass
+
+    def record(self, hit):
+        """
+        Record a cache hit or miss (listings are retrieved by many threads).
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, image, tags, response=None, previous=None):
+        """
+        Save the listing for an image, with validators from the response.
+
+        Validators from a previous entry are kept if the response has none.
+        """
+        entry = {"image": image, "tags": tags, "fetched": time.time()}
+        for key, header in [("etag", "ETag"), ("last_modified", "Last-Modified")]:
+            value = response.headers.get(header) if response is not None else None
+            value = value or (previous or {}).get(key)
+            if value:
+                entry[key] = value
+        utils.write_json(entry, self.get_path(image), compact=True)
+        return entry
+
+    def get_validators(self, entry):
+        """
+        Get headers for a conditional request to revalidate an entry.
+        """
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def prune(self):
+        """
+        Evict the least recently used entries beyond the maximum.
+        """
+        entries = [x for x in os.scandir(self.root) if x.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return 0
+        entries.sort(key=lambda x: x.stat().st_mtime)
+        evicted = entries[: len(entries) - self.max_entries]
+        for entry in evicted:
+            os.remove(entry.path)
+        print(f"Evicted {len(evicted)} tag listings from cache.")
+        return len(evicted)
+
+
+def get_session(workers=1):
+    """
+    Get a requests session with a keep-alive connection pool for the workers.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_tags(image, session=None, url=None, cache=None, client=None):
+    """
+    Retrieve the listing of tags for an image.
+
+    Given a tag cache, a fresh entry is returned without a request, and a
+    stale entry is revalidated (if we have validators) or replaced. Given a
+    registry.RegistryClient that lists tags for the image's registry, tags
+    are listed with the registry v2 API instead of the tags url. If the
+    request fails (e.g., a timeout) the listing is None, so the image is only
+    skipped for this run.
+    """
+    import requests
+
+    entry = cache.get(image) if cache else None
+    if entry and cache.is_fresh(entry):
+        cache.record(hit=True)
+        cache.touch(image)
+        return entry["tags"]
+
+    if client is not None and client.lists_tags(image):
+        return get_registry_tags(image, client, cache)
+
+    print(f"Retrieving tags for {image}")
+    session = session or get_session()
+    headers = cache.get_validators(entry) if cache and not cache.refresh else {}
+    try:
+        response = session.get((url or crane_url).format(image=image), headers=headers)
+    except requests.RequestException as e:
+        print(f"Error retrieving tags for {image}: {e}")
+        return None
+
+    # Not modified, the stale listing is good for another ttl
+    if entry and response.status_code == 304:
+        cache.record(hit=True)
+        return cache.set(image, entry["tags"], response, previous=entry)["tags"]
+
+    tags = [x for x in response.text.split("\n") if x]
+    if cache:
+        cache.record(hit=False)
+        if response.status_code == 200:
+            cache.set(image, tags, response)
+    return tags
+
+
+def get_registry_tags(image, client, cache=None):
+    """
+    Retrieve the listing of tags for an image from its registry.
+
+    The listing can span pages, so a stale entry is replaced (not revalidated).
+    A listing the registry refuses (unauthorized, forbidden or not found) is
+    empty, so the image is skipped. For other errors (e.g., a timeout or a
+    server error) the listing is None, so the image is only skipped for this
+    run. Neither is cached.
+    """
+    import requests
+
+    print(f"Retrieving tags for {image} from its registry")
+    if cache:
+        cache.record(hit=False)
+    try:
+        tags = client.get_tags(image)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error listing tags for {image}: {e}")
+        response = getattr(e, "response", None)
+        if response is not None and response.status_code in refused_statuses:
+            return []
+        return None
+    if cache:
+        cache.set(image, tags)
+    return tags
+
+
+def iter_tags(images, workers=1, session=None, url=None, cache=None, client=None):
+    """
+    Yield (image, tags) for each image, in the order the images are provided.
+
+    With more than one worker, tags are retrieved concurrently using a shared
+    session, but results are still yielded in order.
+    """
+    session = session or get_session(workers)
+
+    def retrieve(image):
+        return get_tags(image, session=session, url=url, cache=cache, client=client)
+
+    yield from utils.iter_ordered(retrieve, images, workers=workers)
@@ -1,16 +1,82 @@
+import collections
 import errno
 import json
 import os
 import re
 import sys
 
+import container_discovery.defaults as defaults
+
+# A faster json backend (orjson) if it is installed, imported on first use
+orjson = False
+
+
+def iter_ordered(func, items, workers=1):
+    """
+    Map a function over items with a pool of threads, and yield (item, result).
+
+    Results are yielded in the order the items are provided, and only a small
+    window of items (twice the number of workers) is in flight at once so
+    that items can be a lazy generator.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= workers * 2:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+def iter_completed(submit, items, limit, on_error=None):
+    """
+    Submit items (submit returns a future) and yield (item, result) as each
+    finishes, with no more than limit items in flight at once.
+
+    Given on_error, an item that raises yields on_error(item, error) instead.
+    """
+    from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+
+    def get_result(future):
+        if on_error is None:
+            return future.result()
+        try:
+            return future.result()
+        except Exception as e:
+            return on_error(pending[future], e)
+
+    pending = {}
+    for item in items:
+        pending[submit(item)] = item
+        if len(pending) >= limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = get_result(future)
+                yield pending.pop(future), result
+    for future in as_completed(list(pending)):
+        result = get_result(future)
+        yield pending.pop(future), result
+
 
 def recursive_find(base, pattern=None):
     """
     Find filenames that match a particular pattern, and yield them.
+
+    Hidden directories (e.g., .git or our own state) are not searched.
     """
     # We can identify modules by finding module.lua
     for root, folders, files in os.walk(base):
+        folders[:] = [x for x in folders if not x.startswith(".")]
         for file in files:
             fullpath = os.path.abspath(os.path.join(root, file))
 
@@ -19,6 +85,70 @@ def recursive_find(base, pattern=None):
             yield fullpath
 
 
+def find_files(base, suffix=".json", absolute=True, workers=1):
+    """
+    Find filenames that end with a suffix, and yield them.
+
+    This is a faster recursive_find for the cache: the suffix is matched
+    literally, and hidden (or other skipped) directories are not searched.
+    Paths are absolute, or relative to the base. With more than one worker,
+    the subdirectories of the base are walked concurrently (and yielded in
+    order).
+    """
+    base = os.path.abspath(base) if absolute else base
+    skip_dirs = set(defaults.skipped_dirs)
+
+    def scan(path):
+        """
+        Get the matching files and the subdirectories to search in a directory.
+
+        Links to directories are not followed (or listed), and a directory we
+        cannot list (e.g., a base that doesn't exist) is empty, as in os.walk.
+        """
+        files, subdirs = [], []
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            return files, subdirs
+        with entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if not is_dir:
+                    if name.endswith(suffix):
+                        files.append(name)
+                elif name[0] != "." and name not in skip_dirs:
+                    if not entry.is_symlink():
+                        subdirs.append(name)
+        return files, subdirs
+
+    def walk(path, prefix):
+        files, subdirs = scan(path)
+        for name in files:
+            yield prefix + name
+        for name in subdirs:
+            yield from walk(os.path.join(path, name), prefix + name + os.sep)
+
+    prefix = os.path.join(base, "") if absolute else ""
+    if workers <= 1:
+        yield from walk(base, prefix)
+        return
+
+    # Files at the top level first, and then each subdirectory in a thread
+    files, subdirs = scan(base)
+    for name in files:
+        yield prefix + name
+
+    def walk_subdir(name):
+        return list(walk(os.path.join(base, name), prefix + name + os.sep))
+
+    for _, filenames in iter_ordered(walk_subdir, subdirs, workers=workers):
+        yield from filenames
+
+
 def mkdirp(dirnames):
     """
     Create one or more directories
@@ -40,22 +170,105 @@ def mkdir_p(path):
             sys.exit("Error creating path %s, exiting." % path)
 
 
-def write_json(json_obj, filename, mode="w"):
+def write_file(content, filename, mode="w"):
     """
-    Write json to a filename
+    Write content to a filename
+
+    A new file is written to a temporary file alongside and then moved into
+    place, so a reader (or a crash) never sees a partially written file.
+    Content is a string (or bytes, with mode wb) or an iterable of them.
     """
-    with open(filename, mode) as filey:
-        filey.writelines(print_json(json_obj))
+    if mode not in ["w", "wb"]:
+        with open(filename, mode) as filey:
+            write_content(filey, content)
+        return filename
+
+    tmpfile = os.path.join(
+        os.path.dirname(filename), ".tmp-%s-%s" % (os.getpid(), os.urandom(16).hex())
+    )
+    try:
+        with open(tmpfile, mode) as filey:
+            write_content(filey, content)
+        os.replace(tmpfile, filename)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
     return filename
 
 
-def print_json(json_obj):
+def get_orjson():
+    """
+    Get the faster json backend, or None to use the standard library.
+    """
+    global orjson
+    if orjson is False:
+        try:
+            import orjson as backend
+        except ImportError:
+            backend = None
+        orjson = backend
+    return orjson
+
+
+def write_content(filey, content):
     """
-    Print json pretty
+    Write a string (in one call) or an iterable of strings to an open file.
     """
+    if isinstance(content, (str, bytes)):
+        filey.write(content)
+    else:
+        filey.writelines(content)
+
+
+def write_json(json_obj, filename, mode="w", compact=False):
+    """
+    Write json to a filename
+
+    Pretty json (for files we review) is indented, and compact json (for files
+    only read by software) has no whitespace.
+    """
+    if compact and get_orjson() is not None and mode == "w":
+        return write_file(dump_json(json_obj), filename, "wb")
+    return write_file(print_json(json_obj, compact), filename, mode)
+
+
+def print_json(json_obj, compact=False):
+    """
+    Print json pretty (or compact)
+    """
+    if compact:
+        return dump_json(json_obj).decode("utf-8")
     return json.dumps(json_obj, indent=4, separators=(",", ": "))
 
 
+def dump_json(json_obj):
+    """
+    Serialize compact json to bytes, with the fast backend if we have it.
+
+    Strings, integers, lists and objects are the same bytes with either
+    backend, but floats can be written differently (e.g., 1e20 or 1e+20),
+    so compare parsed values (and not bytes) for data with floats.
+    """
+    if get_orjson() is not None:
+        try:
+            return orjson.dumps(json_obj)
+        except TypeError:
+            # e.g., integers larger than 64 bits
+            pass
+    return json.dumps(json_obj, separators=(",", ":"), ensure_ascii=False).encode(
+        "utf-8"
+    )
+
+
+def parse_json(content):
+    """
+    Parse json from a string or bytes, with the fast backend if we have it.
+    """
+    if get_orjson() is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
 def read_file(filename, mode="r"):
     """
     Read a file.
@@ -65,8 +278,29 @@ def read_file(filename, mode="r"):
     return content
 
 
+def read_lines(filename):
+    """
+    Read the complete lines of a file that is appended to (e.g., a journal).
+
+    A last line without a newline is an interrupted write, so it is dropped
+    and truncated from the file before we append to it again.
+    """
+    with open(filename, "rb+") as filey:
+        content = filey.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            filey.truncate(end)
+    return content[:end].decode("utf-8").splitlines()
+
+
 def read_json(filename, mode="r"):
     """
     Read a json file to a dictionary.
+
+    The file is parsed from the open file (as bytes for the fast backend).
     """
-    return json.loads(read_file(filename))
+    if get_orjson() is not None:
+        with open(filename, "rb") as filey:
+            return orjson.loads(filey.read())
+    with open(filename, mode) as filey:
+        return json.load(filey)
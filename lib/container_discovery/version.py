@@ -22,9 +22,12 @@ INSTALL_REQUIRES = (
     ("packaging", {"min_version": None}),
 )
 
+# A faster json backend, used if installed
+FAST_REQUIRES = (("orjson", {"min_version": None}),)
+
 TESTS_REQUIRES = (("pytest", {"min_version": "4.6.2"}),)
 
 ################################################################################
 # Submodule Requirements
 
-INSTALL_REQUIRES_ALL = INSTALL_REQUIRES + TESTS_REQUIRES
+INSTALL_REQUIRES_ALL = INSTALL_REQUIRES + FAST_REQUIRES + TESTS_REQUIRES
@@ -0,0 +1,63 @@
+import container_discovery.aliases as aliases
+
+records = [
+    ("samtools", "quay.io/biocontainers/samtools:1.0", "/usr/bin/samtools"),
+    ("samtools", "quay.io/biocontainers/bcftools:1.0", "/usr/bin/samtools"),
+    ("samtools.pl", "quay.io/biocontainers/samtools:1.0", "/usr/bin/samtools.pl"),
+    ("bwa", "quay.io/biocontainers/bwa:0.7", "/usr/bin/bwa"),
+    ("python", "library/python:3.11", "/usr/local/bin/python"),
+    ("sam", "quay.io/biocontainers/sam:2.0", "/usr/bin/sam"),
+]
+
+
+def get_index(tmp_path):
+    filename = str(tmp_path / "aliases.idx")
+    assert aliases.write_index(records, filename) == len(records)
+    return aliases.AliasIndex(filename)
+
+
+def test_query_exact(tmp_path):
+    index = get_index(tmp_path)
+    found = index.query("samtools")
+    assert [x["container"] for x in found] == [
+        "quay.io/biocontainers/bcftools:1.0",
+        "quay.io/biocontainers/samtools:1.0",
+    ]
+    assert index.query("bwa") == [
+        {
+            "alias": "bwa",
+            "container": "quay.io/biocontainers/bwa:0.7",
+            "path": "/usr/bin/bwa",
+        }
+    ]
+    index.close()
+
+
+def test_query_prefix_is_not_a_match(tmp_path):
+    index = get_index(tmp_path)
+
+    # Aliases that share a prefix are separate keys
+    assert [x["alias"] for x in index.query("sam")] == ["sam"]
+    assert [x["alias"] for x in index.query("samtools.pl")] == ["samtools.pl"]
+    assert index.query("samt") == []
+    index.close()
+
+
+def test_query_missing(tmp_path):
+    index = get_index(tmp_path)
+
+    # Before the first, between records, and after the last
+    for alias in ["a", "perl", "zsh", ""]:
+        assert index.query(alias) == []
+    assert len(index) == len(records)
+    index.close()
+
+
+def test_write_index_skips_unindexable_records(tmp_path, capsys):
+    filename = str(tmp_path / "aliases.idx")
+    bad = [("bad\tname", "library/a:1", "/bin/x"), ("ok", "library/b:1", "/bin/\n")]
+    assert aliases.write_index(records + bad, filename) == len(records)
+    assert "skipped 2 aliases" in capsys.readouterr().out
+    index = aliases.AliasIndex(filename)
+    assert index.query("ok") == []
+    index.close()
@@ -0,0 +1,111 @@
+import os
+import random
+import re
+import sys
+
+import pytest
+
+import container_discovery.cache as cache
+import container_discovery.filters as filters
+import container_discovery.guts as guts
+import container_discovery.utils as utils
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(here), "benchmarks"))
+
+import stubs  # noqa
+
+root = "/tmp/cache"
+
+
+def filter_aliases(entry, add_count=25, min_count=10, max_count=1000):
+    """
+    filter_aliases before keepers were selected with a heap, to compare.
+    """
+    image_name = entry.image_name
+    keepers = {}
+    for x, path in entry.aliases.items():
+        if not filters.include_path(path):
+            continue
+        if re.search(image_name.lower(), path.lower()):
+            keepers[x] = path
+        elif (entry.counts.get(x) or 0) <= min_count and filters.include_path(path):
+            keepers[x] = path
+
+    alias_counts = {x: entry.counts[x] for x in entry.aliases if x not in keepers}
+    sorted_counts = {}
+    sorted_keys = sorted(alias_counts, key=alias_counts.get)
+    for x in sorted_keys:
+        sorted_counts[x] = alias_counts[x]
+    sorted_counts = list(sorted_counts.items())
+
+    while add_count > 0 and sorted_counts:
+        keeper, keeper_count = sorted_counts.pop(0)
+        if filters.include_path(keeper) and keeper_count < max_count:
+            keepers[keeper] = entry.aliases[keeper]
+            add_count -= 1
+    return keepers
+
+
+def get_entry(name, aliases, counts):
+    filename = os.path.join(root, "quay.io", "biocontainers", f"{name}:1.0.json")
+    entry = cache.CacheEntry(filename, root, counts)
+    entry.aliases = aliases
+    return entry
+
+
+def test_filter_aliases_matches_baseline():
+    rng = random.Random(0)
+    dirs = ["/usr/local/bin", "/opt/conda/bin", "/usr/bin", "/usr/local/sbin"]
+    for i in range(200):
+        names = [f"tool{x}" for x in rng.sample(range(400), rng.randint(0, 150))]
+        aliases = {x: f"{rng.choice(dirs)}/{x}" for x in names}
+
+        # Few distinct counts, so there are many ties to keep in order
+        counts = {x: rng.choice([1, 5, 11, 20, 50, 999, 1000, 5000]) for x in names}
+        entry = get_entry(
+            rng.choice(["samtools", "tool1", "tool.*", "bwa"]), aliases, counts
+        )
+        for kwargs in [{}, {"add_count": 3}, {"add_count": 0, "max_count": 30}]:
+            expected = filter_aliases(entry, **kwargs)
+            found = entry.filter_aliases(**kwargs)
+            assert list(found.items()) == list(expected.items())
+
+
+def test_filter_aliases_literal_image_name():
+    aliases = {"tool(": "/usr/local/bin/tool(", "tool": "/usr/local/bin/tool"}
+    entry = get_entry("tool(", aliases, {"tool(": 5000, "tool": 5000})
+
+    # The name is not a valid pattern, so it is matched literally
+    assert entry.filter_aliases() == {"tool(": "/usr/local/bin/tool("}
+
+
+def test_run_options():
+    options = cache.RunOptions(tag_workers=4)
+    assert (options.tag_workers, options.guts_workers) == (4, 1)
+    assert cache.RunOptions().tag_workers == 1
+    with pytest.raises(TypeError):
+        cache.RunOptions(tag_worker=4)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_update_with_options(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(guts, "generate_aliases", lambda x: {"tool": "/opt/tool"})
+    monkeypatch.setattr(guts, "pull_image", lambda container: 0)
+    crane = stubs.CraneStub(latency=0, tags=5).start()
+    containers = [f"quay.io/biocontainers/tool{i}" for i in range(4)]
+    root = str(tmp_path)
+    options = cache.RunOptions(
+        tags_url=crane.url, tag_workers=workers, guts_workers=workers
+    )
+    try:
+        uris, skips = cache.update(containers, root, no_cleanup=True, options=options)
+    finally:
+        crane.stop()
+
+    assert sorted(uris) == containers
+    assert skips == set()
+
+    # An entry is written for each image
+    entries = [x for x in utils.find_files(root) if "tool" in os.path.basename(x)]
+    assert len(entries) == len(containers)
@@ -0,0 +1,65 @@
+import json
+import time
+
+import container_discovery.cache as cache
+import container_discovery.checkpoint as checkpoints
+import container_discovery.tags as tags
+
+
+def get_args(root):
+    args = cache.Options()
+    args.add_option("root", str(root))
+    args.add_option("org_prefix", False)
+    args.add_option("registry_prefix", False)
+    args.add_option("repo_prefix", False)
+    return args
+
+
+def test_done_images_without_entries_are_contenders(tmp_path):
+    checkpoint = checkpoints.Checkpoint(str(tmp_path / "checkpoint.json"))
+    for i in range(4):
+        checkpoint.record(f"library/foo{i}", "done")
+    checkpoint.close()
+
+    # The entries of the interrupted run were never committed
+    args = get_args(tmp_path)
+    containers = [f"library/foo{i}:1.0" for i in range(4)]
+    contenders = list(cache.iter_contenders(containers, args, skips=set()))
+    assert contenders == [f"library/foo{i}" for i in range(4)]
+
+
+def test_stale_listings_are_dropped(tmp_path):
+    filename = str(tmp_path / "checkpoint.json")
+    checkpoint = checkpoints.Checkpoint(filename)
+    checkpoint.record("library/old", "tags", listed=time.time() - 100)
+    checkpoint.record("library/old", "tag", tag="1.0")
+    checkpoint.record("library/new", "tags", listed=time.time())
+    checkpoint.record("library/new", "tag", tag="2.0")
+    checkpoint.close()
+
+    checkpoint = checkpoints.Checkpoint(filename, ttl=50)
+    assert checkpoint.get("library/old") == {}
+    assert checkpoint.get("library/new")["tag"] == "2.0"
+    with open(filename) as fd:
+        assert {json.loads(x)["image"] for x in fd} == {"library/new"}
+
+    # Refreshing tags (a ttl of 0) starts every image over
+    assert checkpoints.Checkpoint(filename, ttl=0).states == {}
+
+
+def test_listings_are_kept_by_the_tag_cache(tmp_path):
+    tag_cache = tags.TagCache(str(tmp_path / "tags"))
+    tag_cache.set("library/ubuntu", ["20.04", "22.04"])
+    filename = str(tmp_path / "checkpoint.json")
+    checkpoint = checkpoints.Checkpoint(filename)
+
+    listings = list(
+        cache.iter_listings(["library/ubuntu"], checkpoint, cache=tag_cache)
+    )
+    assert listings == [("library/ubuntu", ["20.04", "22.04"])]
+    checkpoint.close()
+
+    # The checkpoint has when it was listed, and not the listing
+    with open(filename) as fd:
+        records = [json.loads(x) for x in fd]
+    assert [sorted(x) for x in records] == [["image", "listed", "phase"]]
@@ -0,0 +1,83 @@
+import os
+
+import container_discovery.cache as cache
+import container_discovery.digests as digestmap
+import container_discovery.utils as utils
+
+digest = "sha256:" + "a" * 64
+
+
+def get_args(root, digests):
+    args = cache.Options()
+    args.add_option("root", root)
+    args.add_option("org_prefix", False)
+    args.add_option("registry_prefix", False)
+    args.add_option("repo_prefix", False)
+    args.add_option("index", None)
+    args.add_option("report", None)
+    args.add_option("digests", digests)
+    return args
+
+
+def test_digest_map_is_relative_to_root(tmp_path):
+    root = str(tmp_path / "cache")
+    filename = str(tmp_path / "digests.json")
+    digests = digestmap.DigestMap(filename, root)
+    entry = os.path.join(root, "library", "ubuntu:22.04.json")
+    digests.set(digest, entry)
+    assert digests.get(digest) == entry
+    assert digests.get("sha256:" + "b" * 64) is None
+    digests.save()
+    assert utils.read_json(filename) == {digest: "library/ubuntu:22.04.json"}
+
+    # Another root (e.g., a shard run elsewhere) finds the entry under its own
+    moved = digestmap.DigestMap(filename, str(tmp_path / "other"))
+    assert moved.get(digest) == str(tmp_path / "other" / "library/ubuntu:22.04.json")
+
+
+def test_digest_map_load_keeps_existing(tmp_path):
+    first, second = str(tmp_path / "first.json"), str(tmp_path / "second.json")
+    utils.write_json({digest: "library/a:1.json"}, first)
+    utils.write_json(
+        {digest: "library/b:1.json", "sha256:c": "library/c:1.json"}, second
+    )
+    digests = digestmap.DigestMap(first, str(tmp_path))
+    digests.load(second)
+    assert len(digests) == 2
+    assert digests.get(digest).endswith("library/a:1.json")
+
+    # Loading is not a change, so nothing is saved
+    digests.save()
+    assert utils.read_json(first) == {digest: "library/a:1.json"}
+
+
+def test_reuse_digest_writes_entry_for_tag(tmp_path):
+    root = str(tmp_path)
+    digests = digestmap.DigestMap(str(tmp_path / "digests.json"), root)
+    args = get_args(root, digests)
+    aliases = {"bash": "/bin/bash"}
+    entry = cache.write_cache_entry(
+        cache.get_cache_entry("library/ubuntu", args, "1"), aliases
+    )
+    digests.set(digest, entry)
+
+    found = cache.reuse_digest("mirror/ubuntu", args, "latest", digest)
+    assert found == aliases
+    assert (
+        utils.read_json(os.path.join(root, "mirror", "ubuntu:latest.json")) == aliases
+    )
+    assert (digests.hits, digests.misses) == (1, 0)
+
+
+def test_reuse_digest_misses(tmp_path):
+    root = str(tmp_path)
+    digests = digestmap.DigestMap(str(tmp_path / "digests.json"), root)
+    args = get_args(root, digests)
+
+    # We don't know the digest, nothing has it, or its entry is gone
+    assert cache.reuse_digest("mirror/ubuntu", args, "latest", None) is None
+    assert cache.reuse_digest("mirror/ubuntu", args, "latest", digest) is None
+    digests.set(digest, os.path.join(root, "library", "ubuntu:1.json"))
+    assert cache.reuse_digest("mirror/ubuntu", args, "latest", digest) is None
+    assert (digests.hits, digests.misses) == (0, 2)
+    assert not os.path.exists(os.path.join(root, "mirror"))
@@ -0,0 +1,81 @@
+import os
+import random
+
+import container_discovery.filters as filters
+
+dirs = ["/usr/local/bin", "/opt/conda/bin", "/usr/bin", "/usr/local/sbin", "/bin"]
+names = ["samtools", "_private", ".hidden", "README", "run[1]", "bwa", "sbin-tool"]
+endings = ["", ".py", ".sh", ".so", ".md", ".d", ".db3", "post-link.sh", ".debug"]
+
+
+def include_path(path):
+    """
+    The filter before it was compiled, to compare decisions.
+    """
+    for ending in [
+        "post-link.sh",
+        ".debug",
+        "pre-link.sh",
+        ".so",
+        ".dll",
+        ".gz",
+        ".dna",
+        ".dox",
+        ".db",
+        ".db3",
+        ".config",
+        ".defaults",
+        ".dat",
+        ".dn",
+        ".d",
+        ".md",
+    ]:
+        if path.endswith(ending):
+            return False
+    if os.path.basename(path).startswith("_"):
+        return False
+    if os.path.basename(path).startswith("."):
+        return False
+    if "[" in path or "]" in path or "README" in path:
+        return False
+    return "sbin" not in path and "/usr/bin" not in path and not path.startswith("/bin")
+
+
+def get_paths(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(dirs)}/{rng.choice(names)}{rng.randint(0, 50)}{rng.choice(endings)}"
+        for _ in range(count)
+    ]
+
+
+def test_include_path_matches_baseline():
+    path_filter = filters.PathFilter()
+    for path in get_paths(5000) + ["/bin", "/binary/x", "/opt/x.d/tool", "/a/b"]:
+        assert path_filter.include(path) == include_path(path), path
+        assert filters.include_path(path) == include_path(path), path
+
+
+def test_filter_paths():
+    paths = get_paths(500, seed=1)
+    assert filters.filter_paths(paths) == [x for x in paths if include_path(x)]
+
+    # Given a dict, paths are the values
+    aliases = {os.path.basename(x): x for x in paths}
+    assert filters.filter_paths(aliases) == {
+        k: v for k, v in aliases.items() if include_path(v)
+    }
+
+
+def test_path_filter_memo():
+    path_filter = filters.PathFilter(endings=[".txt"], cache_size=2)
+    assert not path_filter.include("/opt/notes.txt")
+    assert path_filter.include("/opt/notes.md")
+    assert path_filter.include("/opt/notes.md")
+    assert path_filter.include.cache_info().hits == 1
+
+    # Decisions beyond the cache size are evicted, and made again
+    path_filter.include("/opt/tool")
+    assert path_filter.include.cache_info().currsize == 2
+    assert not path_filter.include("/opt/notes.txt")
+    assert path_filter.include.cache_info().misses == 4
@@ -0,0 +1,27 @@
+import os
+import time
+
+import container_discovery.guts as guts
+
+
+def generate_aliases(container):
+    if container.startswith("library/die"):
+        os._exit(1)
+    time.sleep(0.05)
+    return {container.split(":")[0]: "/usr/bin/tool"}
+
+
+def test_dead_worker_fails_only_in_flight(monkeypatch):
+    # Workers are forked, so they inherit the replacements
+    monkeypatch.setattr(guts, "generate_aliases", generate_aliases)
+    monkeypatch.setattr(guts, "pull_image", lambda container: 0)
+
+    selected = [("library/die", "1.0")] + [(f"library/ok{i}", "1.0") for i in range(8)]
+    results = dict(guts.iter_generate(selected, workers=2, no_cleanup=True))
+    assert sorted(results) == sorted(selected)
+    assert results[("library/die", "1.0")][1] == guts.worker_died
+
+    # Containers submitted after the worker died go to a new pool
+    aliases, error, _ = results[("library/ok7", "1.0")]
+    assert error is None
+    assert aliases == {"library/ok7": "/usr/bin/tool"}
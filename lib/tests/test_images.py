@@ -0,0 +1,60 @@
+import pytest
+
+import container_discovery.guts as guts
+import container_discovery.images as images
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """
+    Images we have pulled, by name, with their size and layers.
+    """
+    pulled = {}
+    monkeypatch.setattr(guts, "get_image_size", lambda x: pulled.get(x, {}).get("size"))
+    monkeypatch.setattr(
+        guts, "get_image_layers", lambda x: pulled.get(x, {}).get("layers", [])
+    )
+    monkeypatch.setattr(guts, "remove_image", lambda x: pulled.pop(x, None) is not None)
+    return pulled
+
+
+def pull(docker, budget, container, size, layers):
+    docker[container] = {"size": size, "layers": layers}
+    budget.add(container, size)
+
+
+def test_evict_least_recently_used(docker):
+    budget = images.ImageBudget(max_bytes=250)
+    for name in ["a", "b", "c"]:
+        pull(docker, budget, name, 100, [f"layer-{name}"])
+    assert budget.evict() == ["a"]
+
+    # A used image moves to the end, so it is evicted last
+    budget.add("b", 100)
+    pull(docker, budget, "d", 100, ["layer-d"])
+    assert budget.evict() == ["c"]
+    assert list(budget.images) == ["b", "d"]
+    assert budget.evicted == 2
+
+
+def test_evict_within_budget(docker):
+    budget = images.ImageBudget(max_bytes=250)
+    pull(docker, budget, "a", 100, ["layer-a"])
+    pull(docker, budget, "b", 200, ["layer-b"])
+
+    # Guts removed b when it finished, so we are within the budget
+    del docker["b"]
+    assert budget.evict() == []
+    assert list(budget.images) == ["a"]
+
+
+def test_evict_keeps_shared_layers(docker):
+    budget = images.ImageBudget(max_bytes=150)
+    pull(docker, budget, "base-user", 100, ["base", "layer-a"])
+    pull(docker, budget, "other", 100, ["layer-b"])
+    pull(docker, budget, "pending", 100, ["base", "layer-c"])
+
+    # Images that share layers with pending work are kept, even if over budget
+    assert budget.evict(pending=["pending"]) == ["other"]
+    assert list(budget.images) == ["base-user", "pending"]
+    assert budget.total == 200
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(os.path.dirname(here), "benchmarks", "importtime.py")
+
+# Wall clock on shared runners is noisy, so the budget is only checked on request
+budget = os.environ.get("IMPORTTIME_BUDGET")
+
+
+def run_script(*args):
+    result = subprocess.run(
+        [sys.executable, script, "--repeat", "3", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout
+
+
+def test_no_heavy_imports():
+    """
+    Commands that must start fast import nothing heavy.
+    """
+    run_script("--no-budget")
+
+
+@pytest.mark.skipif(not budget, reason="IMPORTTIME_BUDGET is not set")
+def test_import_time_budget():
+    """
+    Commands that must start fast are within budget (in milliseconds).
+    """
+    run_script("--budget", budget)
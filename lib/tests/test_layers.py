@@ -0,0 +1,205 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+import container_discovery.layers as layers
+
+
+def make_layer(entries):
+    """
+    Make a gzipped layer tar from (path, kind, target) entries.
+    """
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as tar:
+        for path, kind, target in entries:
+            info = tarfile.TarInfo(path.lstrip("/"))
+            if kind == "d":
+                info.type = tarfile.DIRTYPE
+            elif kind == "l":
+                info.type, info.linkname = tarfile.SYMTYPE, target
+            tar.addfile(info, io.BytesIO(b"") if kind == "f" else None)
+    return data.getvalue()
+
+
+def get_files(*listings):
+    fs = layers.Filesystem()
+    for listing in listings:
+        fs.add_layer(listing)
+    return list(fs.iter_files())
+
+
+class Response:
+    def __init__(self, content):
+        self.raw = io.BytesIO(content)
+
+
+class Client:
+    """
+    A stand-in registry client for an image with layers and a config.
+    """
+
+    def __init__(self, blobs, config):
+        self.blobs = blobs
+        self.config = config
+
+    def get_manifest(self, container):
+        return {"layers": [{"digest": digest} for digest in self.blobs]}
+
+    def get_config(self, container, manifest):
+        return {"config": self.config}
+
+    def get_blob(self, container, digest, stream=False):
+        return Response(self.blobs[digest])
+
+
+def get_client(layer_entries, config):
+    blobs = {
+        f"sha256:{i:064x}": make_layer(entries)
+        for i, entries in enumerate(layer_entries)
+    }
+    return Client(blobs, config)
+
+
+@pytest.fixture
+def base(monkeypatch):
+    monkeypatch.setattr(layers, "base_filesystem", {"/bin/sh"})
+
+
+def test_scan_layer():
+    content = make_layer([("/bin", "d", None), ("/bin/sh", "f", None)])
+    listing = layers.scan_layer(io.BytesIO(content))
+    assert listing == [["/bin", "d", None], ["/bin/sh", "f", None]]
+
+
+def test_whiteout_removes_lower_path():
+    lower = [["/a/x", "f", None], ["/a/y", "f", None]]
+    assert get_files(lower, [["/a/.wh.x", "f", None]]) == ["/a/y"]
+
+
+def test_opaque_whiteout_removes_directory_contents():
+    lower = [["/a/x", "f", None], ["/a/sub/y", "f", None]]
+    upper = [["/a/.wh..wh..opq", "f", None], ["/a/z", "f", None]]
+    assert get_files(lower, upper) == ["/a/z"]
+
+
+def test_file_replaces_directory():
+    assert get_files([["/a/x", "f", None]], [["/a", "f", None]]) == ["/a"]
+
+
+def test_directory_replaces_file():
+    assert get_files([["/a", "f", None]], [["/a/x", "f", None]]) == ["/a/x"]
+
+
+def test_symlinked_path_directories():
+    fs = layers.Filesystem()
+    fs.add_layer(
+        [
+            ["/opt/tools/bin/t", "f", None],
+            ["/usr/local/bin", "l", "/opt/tools/bin"],
+            ["/usr/bin", "l", "../opt/tools/bin"],
+        ]
+    )
+    for path in ["/usr/local/bin", "/usr/bin"]:
+        assert fs.resolve(path) == "/opt/tools/bin"
+        assert fs.listdir(path) == ["t"]
+
+    # Links to directories are not files, as in a walk of the filesystem
+    assert list(fs.iter_files()) == ["/opt/tools/bin/t"]
+
+
+def test_path_from_config_env(tmp_path, base):
+    entries = [[("/opt/bin/x", "f", None), ("/usr/bin/y", "f", None)]]
+    cache = layers.LayerCache(str(tmp_path))
+    client = get_client(entries, {"Env": ["PATH=/opt/bin", "LANG=C"]})
+    assert layers.get_unique_paths("example", cache, client) == ["/opt/bin/x"]
+
+
+def test_path_defaults_without_env(tmp_path, base):
+    entries = [[("/opt/bin/x", "f", None), ("/usr/bin/y", "f", None)]]
+    cache = layers.LayerCache(str(tmp_path))
+    client = get_client(entries, {"Env": ["LANG=C"]})
+    assert layers.get_unique_paths("example", cache, client) == ["/usr/bin/y"]
+
+    # The layers are cached, so they are not scanned again
+    layers.get_unique_paths("example", cache, client)
+    assert cache.hits == 1
+
+
+# An image with whiteouts, replaced paths and a symlinked PATH directory
+fixture_layers = [
+    [
+        ("/bin/sh", "f", None),
+        ("/usr/bin/python", "f", None),
+        ("/usr/local/bin", "d", None),
+        ("/opt/old/tool", "f", None),
+        ("/etc/conf/a", "f", None),
+        ("/data", "f", None),
+        ("/opt/app/bin/app", "f", None),
+        ("/opt/app/bin/gone", "f", None),
+    ],
+    [
+        ("/opt/app/bin/.wh.gone", "f", None),
+        ("/etc/conf/.wh..wh..opq", "f", None),
+        ("/etc/conf/b", "f", None),
+        ("/opt/old", "f", None),
+        ("/data/x", "f", None),
+        ("/app", "l", "opt/app"),
+        ("/usr/local/bin/tool", "f", None),
+        ("/usr/local/bin/python3", "l", "/usr/bin/python"),
+        ("/usr/bin/entry", "f", None),
+    ],
+]
+
+# The same image, as docker would export it
+fixture_files = [
+    "/bin/sh",
+    "/usr/bin/python",
+    "/usr/bin/entry",
+    "/usr/local/bin/tool",
+    "/opt/old",
+    "/etc/conf/b",
+    "/data/x",
+    "/opt/app/bin/app",
+]
+fixture_links = {"/app": "opt/app", "/usr/local/bin/python3": "/usr/bin/python"}
+fixture_config = {
+    "Env": ["PATH=/app/bin:/usr/local/bin:/usr/bin"],
+    "Entrypoint": ["/opt/old"],
+}
+
+
+def test_unique_paths_match_guts(tmp_path, base):
+    pytest.importorskip("container_guts")
+    from container_guts.main import ManifestGenerator
+    from container_guts.main.database import Database
+
+    root = str(tmp_path / "root")
+    for path in fixture_files:
+        os.makedirs(os.path.dirname(root + path), exist_ok=True)
+        open(root + path, "w").close()
+    for path, target in fixture_links.items():
+        os.symlink(target, root + path)
+
+    # Guts' own diff of the exported filesystem against the base images
+    database = tmp_path / "database"
+    database.mkdir()
+    with open(database / "base.json", "w") as fd:
+        json.dump({"base:latest": {"fs": sorted(layers.base_filesystem)}}, fd)
+    # (without a container runtime, as we only use its parsing of a filesystem)
+    gen = ManifestGenerator.__new__(ManifestGenerator)
+    paths = [x for env in fixture_config["Env"] for x in gen._parse_paths(env)]
+    manifest = {
+        "fs": gen.extract_filesystem(root),
+        "paths": gen.explore_paths(root, paths),
+        "entrypoint": fixture_config["Entrypoint"],
+    }
+    expected = Database(str(database)).diff(manifest)["unique_paths"]
+
+    cache = layers.LayerCache(str(tmp_path / "layers"))
+    client = get_client(fixture_layers, fixture_config)
+    found = layers.get_unique_paths("example", cache, client)
+    assert found == expected
+    assert "/usr/local/bin/tool" in found
@@ -0,0 +1,71 @@
+import os
+
+import container_discovery.metrics as metrics
+import container_discovery.utils as utils
+
+
+def write_entry(root, name, aliases):
+    filename = os.path.join(root, "quay.io", "biocontainers", f"{name}.json")
+    utils.mkdir_p(os.path.dirname(filename))
+    utils.write_json({x: f"/usr/bin/{x}" for x in aliases}, filename)
+    return filename
+
+
+def assert_same_counts(root, state_file):
+    incremental = metrics.get_incremental_counts(root, state_file)
+    full = metrics.get_total_counts(root)
+    assert utils.dump_json(incremental) == utils.dump_json(full)
+
+
+def test_incremental_counts_match_full_counts(tmp_path, capsys):
+    root = str(tmp_path / "cache")
+    state_file = str(tmp_path / "counts-state.json")
+    for i in range(10):
+        write_entry(root, f"tool{i}:1.0", [f"tool{i}", "python", f"helper{i % 3}"])
+    assert_same_counts(root, state_file)
+
+    # Added, modified (same size and not) and removed entries
+    write_entry(root, "tool10:1.0", ["tool10", "python", "perl"])
+    write_entry(root, "tool0:1.0", ["tool0", "pythom", "helper0"])
+    write_entry(root, "tool1:1.0", ["tool1", "R"])
+    os.remove(os.path.join(root, "quay.io", "biocontainers", "tool2:1.0.json"))
+    assert_same_counts(root, state_file)
+    assert "Added 1, modified 2, removed 1 files." in capsys.readouterr().out
+
+
+def test_incremental_counts_ignore_touched_files(tmp_path, capsys):
+    root = str(tmp_path / "cache")
+    state_file = str(tmp_path / "counts-state.json")
+    filenames = [write_entry(root, f"tool{i}:1.0", [f"tool{i}"]) for i in range(5)]
+    assert_same_counts(root, state_file)
+
+    # A fresh checkout has new modified times, but the same content
+    for filename in filenames:
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    capsys.readouterr()
+    assert_same_counts(root, state_file)
+    assert "Added 0, modified 0, removed 0 files." in capsys.readouterr().out
+
+
+def test_sharded_counts_match_total_counts(tmp_path):
+    root = str(tmp_path / "cache")
+    for registry in ["quay.io", "docker.io", "ghcr.io"]:
+        for i in range(6):
+            filename = os.path.join(root, registry, f"org{i % 2}", f"tool{i}:1.0.json")
+            utils.mkdir_p(os.path.dirname(filename))
+            utils.write_json({f"tool{i}": "/bin/x", registry: "/bin/y"}, filename)
+    utils.write_json({"top": "/bin/top"}, os.path.join(root, "top:1.0.json"))
+    utils.write_json({"python": 1}, os.path.join(root, "counts.json"))
+
+    # Links to directories (and hidden directories) are not counted
+    outside = str(tmp_path / "outside")
+    write_entry(outside, "linked:1.0", ["linked"])
+    os.symlink(outside, os.path.join(root, "docker.io", "linked"))
+    write_entry(os.path.join(root, ".container-discovery"), "hidden:1.0", ["hidden"])
+
+    total = metrics.get_total_counts(root)
+    assert "linked" not in total and "hidden" not in total
+    for workers in [2, 4]:
+        sharded = metrics.get_total_counts(root, workers=workers)
+        assert utils.dump_json(sharded) == utils.dump_json(total)
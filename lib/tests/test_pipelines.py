@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+import container_discovery.pipelines as pipelines
+
+pytest.importorskip("pipelib")
+
+words = ["latest", "stable", "edge", "master", "main", "nightly"]
+
+
+def get_version(rng):
+    return ".".join(str(rng.randint(0, 12)) for _ in range(rng.randint(1, 4)))
+
+
+def get_semver(rng):
+    return get_version(rng)
+
+
+def get_conda(rng):
+    build = "".join(rng.choice("abcdefh0123456789") for _ in range(7))
+    return f"{get_version(rng)}--{build}_{rng.randint(0, 3)}"
+
+
+def get_mixed(rng):
+    return rng.choice([get_semver, get_conda, lambda rng: rng.choice(words)])(rng)
+
+
+def get_word(rng):
+    return rng.choice(words)
+
+
+@pytest.mark.parametrize("get_tag", [get_semver, get_conda, get_mixed, get_word])
+def test_fast_select_tag_matches_pipeline(get_tag):
+    rng = random.Random(get_tag.__name__)
+    for _ in range(200):
+        tags = [get_tag(rng) for _ in range(rng.randint(1, 30))]
+        handled, tag = pipelines.fast_select_tag(tags)
+        assert handled, tags
+
+        ordered = pipelines.get_tags_pipeline().run(tags, unwrap=False)
+        assert tag == (ordered[0]._original if ordered else None), tags
+
+
+def test_fast_select_tag_falls_back():
+    assert pipelines.fast_select_tag(["1.0.0", "v2.0.0"]) == (False, None)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import pytest
+
+import container_discovery.registry as registry
+import container_discovery.tags as tags
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(here), "benchmarks"))
+
+import stubs  # noqa
+import synthetic  # noqa
+
+statuses = {
+    "library/unauthorized": 401,
+    "library/forbidden": 403,
+    "library/missing": 404,
+    "library/unavailable": 503,
+}
+
+
+@pytest.fixture
+def stub():
+    stub = stubs.RegistryStub(latency=0, tags=45, statuses=statuses).start()
+    yield stub
+    stub.stop()
+
+
+def test_tags_follow_link_pages(stub):
+    client = registry.RegistryClient(page_size=10)
+    listing = client.get_tags(f"{stub.registry}/library/ubuntu")
+
+    seed = sum(b"library/ubuntu")
+    expected = list(dict.fromkeys(synthetic.generate_tags(45, seed)))
+    assert listing == expected
+
+    # One challenge, one token, and a request for each page
+    pages = (len(expected) + 9) // 10
+    assert stub.requests == 2 + pages
+
+
+def test_tokens_are_reused_per_scope(stub):
+    client = registry.RegistryClient()
+    client.get_tags(f"{stub.registry}/library/ubuntu")
+    client.get_tags(f"{stub.registry}/library/ubuntu:latest")
+    assert stub.tokens == 1
+
+    # Another repository is another scope (without another challenge)
+    requests = stub.requests
+    client.get_tags(f"{stub.registry}/library/debian")
+    assert stub.tokens == 2
+    assert stub.requests == requests + 2
+
+    client.get_tags(f"{stub.registry}/library/ubuntu")
+    assert stub.tokens == 2
+
+
+@pytest.mark.parametrize("name", ["unauthorized", "forbidden", "missing"])
+def test_refused_listings_are_empty(stub, name):
+    client = registry.RegistryClient()
+    assert tags.get_registry_tags(f"{stub.registry}/library/{name}", client) == []
+
+
+def test_server_errors_skip_for_the_run(stub):
+    client = registry.RegistryClient()
+    image = f"{stub.registry}/library/unavailable"
+    assert tags.get_registry_tags(image, client) is None
+
+
+def test_timeouts_skip_for_the_run():
+    stub = stubs.RegistryStub(latency=0.5).start()
+    try:
+        client = registry.RegistryClient(timeout=0.05)
+        image = f"{stub.registry}/library/ubuntu"
+        assert tags.get_registry_tags(image, client) is None
+    finally:
+        stub.stop()
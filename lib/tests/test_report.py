@@ -0,0 +1,96 @@
+import contextlib
+
+import container_discovery.cache as cache
+import container_discovery.report as reports
+import container_discovery.utils as utils
+
+
+class TagCache:
+    hits = 3
+    misses = 1
+
+
+def get_report():
+    report = reports.RunReport()
+    report.add_time("library/a", "tags", 0.5)
+    with reports.time_phase(report, "library/a", "guts"):
+        pass
+    report.set_status("library/a", "generated", tag="1.0")
+    report.skip("library/b", "unauthorized")
+    report.skip("library/c", "unauthorized")
+    report.count("pulled_bytes", 1024)
+    report.count("alias_cache_hits", 2)
+    report.sample_queue("tags", 4)
+    report.sample_queue("tags", 2)
+    report.finish(TagCache())
+    return report
+
+
+def test_report_to_dict():
+    data = get_report().to_dict()
+    assert data["statuses"] == {"generated": 1, "skipped": 2}
+    assert data["skips"] == {"unauthorized": 2}
+    assert data["counters"]["tag_cache_hits"] == 3
+    assert data["queues"] == {"tags": {"max": 4, "mean": 3}}
+    assert list(data["phases"]) == ["tags", "guts"]
+    assert data["images"]["library/a"]["tag"] == "1.0"
+    assert data["images"]["library/a"]["phases"]["tags"] == 0.5
+
+
+def test_report_hooks_wrap_phases():
+    calls = []
+
+    @contextlib.contextmanager
+    def hook(image, phase):
+        calls.append((image, phase))
+        yield
+
+    report = reports.RunReport(hooks=[hook])
+    with reports.time_phase(report, "library/a", "pull"):
+        pass
+    assert calls == [("library/a", "pull")]
+
+    # Without a report, nothing is timed
+    with reports.time_phase(None, "library/a", "pull"):
+        pass
+
+
+def test_report_to_prometheus(tmp_path):
+    report = get_report()
+    text = report.to_prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE container_discovery_skips_total counter" in lines
+    assert 'container_discovery_skips_total{reason="unauthorized"} 2' in lines
+    assert 'container_discovery_images_total{status="generated"} 1' in lines
+    assert 'container_discovery_tag_cache_total{result="hit"} 3' in lines
+    assert 'container_discovery_alias_cache_total{result="hit"} 2' in lines
+    assert 'container_discovery_alias_cache_total{result="miss"} 0' in lines
+    assert "container_discovery_pulled_bytes_total 1024" in lines
+    assert 'container_discovery_queue_depth_max{stage="tags"} 4' in lines
+
+    # Every sample has a HELP and TYPE for its metric
+    names = {x.split()[2] for x in lines if x.startswith("# TYPE")}
+    for line in lines:
+        if not line.startswith("#"):
+            assert line.split("{")[0].split()[0] in names
+
+    filename = str(tmp_path / "metrics.prom")
+    report.save_prometheus(filename)
+    assert utils.read_file(filename) == text
+
+
+def test_contenders_count_alias_cache(tmp_path):
+    args = cache.Options()
+    args.add_option("root", str(tmp_path))
+    args.add_option("org_prefix", False)
+    args.add_option("registry_prefix", False)
+    args.add_option("repo_prefix", False)
+    args.add_option("report", reports.RunReport())
+    cache.write_cache_entry(cache.get_cache_entry("library/a", args, "1.0"), {})
+
+    containers = ["library/a:2.0", "library/b:1.0", "library/b:2.0", "library/c"]
+    contenders = list(cache.iter_contenders(containers, args, skips={"library/c"}))
+    assert contenders == ["library/b"]
+    assert args.report.counters["alias_cache_hits"] == 1
+    assert args.report.counters["alias_cache_misses"] == 1
@@ -0,0 +1,91 @@
+import os
+
+import container_discovery.digests as digestmap
+import container_discovery.shards as shards
+import container_discovery.skips as skiplist
+import container_discovery.utils as utils
+
+
+def test_get_shard_ignores_tag():
+    for image in ["quay.io/biocontainers/samtools", "ubuntu"]:
+        assert shards.get_shard(f"{image}:1.0", 16) == shards.get_shard(image, 16)
+
+
+def test_get_shard_registry_with_port():
+    images = [f"localhost:5000/foo{i}" for i in range(32)]
+    assigned = [shards.get_shard(f"{x}:1.0", 8) for x in images]
+    assert assigned == [shards.get_shard(x, 8) for x in images]
+
+    # Images are spread by their name, not all hashed as "localhost"
+    assert len(set(assigned)) > 1
+
+
+def test_filter_shard_is_disjoint():
+    containers = [f"localhost:5000/foo{i}:1.0" for i in range(32)]
+    filtered = [shards.filter_shard(containers, i, 4) for i in range(4)]
+    assert sorted(sum(filtered, [])) == sorted(containers)
+
+
+def write_skips(skips_file, images, compact=True):
+    skips = skiplist.SkipsJournal(skips_file)
+    for image in images:
+        skips.add(image)
+    if compact:
+        skips.close()
+    elif skips.fd is not None:
+        skips.fd.close()
+
+
+def write_entry(root, relpath, aliases):
+    filename = os.path.join(root, relpath)
+    utils.mkdir_p(os.path.dirname(filename))
+    utils.write_json(aliases, filename)
+    return filename
+
+
+def test_merge_shards_same_root(tmp_path):
+    root = str(tmp_path)
+    write_skips(os.path.join(root, "skips.json"), ["library/a"])
+    write_skips(shards.get_skips_file(root, 0, 2), ["library/b"])
+
+    # An interrupted shard only has a journal
+    write_skips(shards.get_skips_file(root, 1, 2), ["library/c"], compact=False)
+    for index, entry in enumerate(["library/b:1.json", "library/c:1.json"]):
+        digests = digestmap.DigestMap(shards.get_digests_file(root, index, 2), root)
+        digests.set(f"sha256:{index}", os.path.join(root, entry))
+        digests.save()
+
+    assert shards.merge_shards(root) == (0, [])
+    skips_file = os.path.join(root, "skips.json")
+    assert utils.read_json(skips_file) == ["library/a", "library/b", "library/c"]
+    digests = digestmap.DigestMap(
+        os.path.join(root, ".container-discovery", "digests.json"), root
+    )
+    assert digests.get("sha256:1") == os.path.join(root, "library/c:1.json")
+
+    # Only the merged skips and digests are left in the state directory
+    assert sorted(os.listdir(os.path.join(root, ".container-discovery"))) == [
+        "digests.json"
+    ]
+
+
+def test_merge_shards_elsewhere(tmp_path):
+    root, shard_root = str(tmp_path / "root"), str(tmp_path / "shard")
+    existing = write_entry(root, "library/a:1.json", {"a": "/usr/local/bin/a"})
+    write_entry(shard_root, "library/a:1.json", {"a": "/opt/bin/a"})
+    write_entry(shard_root, "library/b:1.json", {"b": "/usr/local/bin/b"})
+    utils.write_json({"a": 1}, os.path.join(shard_root, "counts.json"))
+    shard_skips = shards.get_skips_file(shard_root, 0, 2)
+    write_skips(shard_skips, ["library/c"])
+
+    copied, conflicts = shards.merge_shards(root, [shard_root])
+    assert (copied, conflicts) == (1, [existing])
+
+    # The existing entry is kept, and reserved files are not copied
+    assert utils.read_json(existing) == {"a": "/usr/local/bin/a"}
+    assert os.path.exists(os.path.join(root, "library", "b:1.json"))
+    assert not os.path.exists(os.path.join(root, "counts.json"))
+
+    # Skips are merged, and the shard run elsewhere keeps its own
+    assert utils.read_json(os.path.join(root, "skips.json")) == ["library/c"]
+    assert os.path.exists(shard_skips)
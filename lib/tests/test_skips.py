@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import container_discovery.skips as skiplist
+import container_discovery.utils as utils
+
+
+def test_torn_line_is_dropped_on_replay(tmp_path):
+    skips_file = str(tmp_path / "skips.json")
+    utils.write_json(["library/base"], skips_file)
+    journal = skiplist.get_journal(skips_file)
+    assert os.path.dirname(journal) == str(tmp_path / ".container-discovery")
+    utils.mkdir_p(os.path.dirname(journal))
+    with open(journal, "w") as fd:
+        fd.write("library/one\nlibrary/two\nlibrary/thr")
+
+    skips = skiplist.SkipsJournal(skips_file)
+    assert set(skips) == {"library/base", "library/one", "library/two"}
+
+    # The journal is truncated to the last whole line, so appends are whole
+    skips.add("library/three")
+    with open(journal) as fd:
+        assert fd.read() == "library/one\nlibrary/two\nlibrary/three\n"
+    assert "library/three" in skiplist.SkipsJournal(skips_file)
+
+
+def test_journal_is_compacted_at_threshold(tmp_path):
+    skips_file = str(tmp_path / "skips.json")
+    journal = skiplist.get_journal(skips_file)
+    skips = skiplist.SkipsJournal(skips_file, batch_size=2, max_journal=3)
+    for image in ["library/c", "library/a"]:
+        skips.add(image)
+    assert not os.path.exists(skips_file)
+    assert os.path.exists(journal)
+
+    skips.add("library/b")
+    assert utils.read_json(skips_file) == ["library/a", "library/b", "library/c"]
+    assert not os.path.exists(journal)
+
+    # Skips added after compacting are journaled again, and compacted on close
+    skips.add("library/d")
+    assert os.path.exists(journal)
+    skips.close()
+    assert utils.read_json(skips_file)[-1] == "library/d"
+    assert not os.path.exists(journal)
+
+    # A closed journal takes no more skips
+    with pytest.raises(ValueError):
+        skips.add("library/e")
+    assert not os.path.exists(journal)
+
+
+def test_update_is_not_journaled(tmp_path):
+    skips_file = str(tmp_path / "skips.json")
+    skips = skiplist.SkipsJournal(skips_file)
+    skips.update(["library/a", "library/b"])
+    assert "library/a" in skips
+    assert not os.path.exists(skiplist.get_journal(skips_file))
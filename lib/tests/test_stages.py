@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+import container_discovery.checkpoint as checkpoints
+import container_discovery.stages as stages
+
+
+def test_pipeline_streams_in_order():
+    pipeline = stages.Pipeline(maxsize=2)
+    pipeline.add_stage("double", lambda items: (x * 2 for x in items))
+    pipeline.add_stage("add", lambda items: (x + 1 for x in items))
+    assert list(pipeline.run(range(10))) == [x * 2 + 1 for x in range(10)]
+
+
+def test_pipeline_joins_stages_before_raising():
+    written = []
+
+    def write(items):
+        for x in items:
+            time.sleep(0.01)
+            written.append(x)
+            yield x
+
+    def fail(items):
+        for x in items:
+            if x == 3:
+                raise ValueError("failed")
+            yield x
+
+    pipeline = stages.Pipeline(maxsize=1, poll=0.01)
+    pipeline.add_stage("write", write)
+    pipeline.add_stage("fail", fail)
+    with pytest.raises(ValueError):
+        list(pipeline.run(range(100)))
+
+    # Nothing is still writing once the error reaches the consumer
+    assert not any(stage.thread.is_alive() for stage in pipeline.stages)
+    count = len(written)
+    time.sleep(0.05)
+    assert len(written) == count
+
+
+def test_stage_slow_past_join_cannot_record(tmp_path):
+    filename = str(tmp_path / "checkpoint.json")
+    checkpoint = checkpoints.Checkpoint(filename)
+
+    def slow(items):
+        for x in items:
+            time.sleep(0.2)
+            checkpoint.record(f"library/foo{x}", "done")
+            yield x
+
+    pipeline = stages.Pipeline(maxsize=1, poll=0.01, timeout=0.01)
+    pipeline.add_stage("slow", slow)
+    results = pipeline.run(range(10))
+    assert next(results) == 0
+    results.close()
+    checkpoint.close()
+
+    # The stage outlived the join, and its record after close is refused
+    assert pipeline.stages[0].thread.is_alive()
+    time.sleep(0.3)
+    assert isinstance(pipeline.error, ValueError)
+    with open(filename) as fd:
+        assert len(fd.readlines()) == 1
@@ -0,0 +1,117 @@
+import os
+
+import container_discovery.store as store
+import container_discovery.utils as utils
+
+entries = {
+    "quay.io/biocontainers/samtools:1.0.json": {"samtools": "/usr/bin/samtools"},
+    "quay.io/biocontainers/samtools:1.1.json": {"samtools": "/usr/local/bin/samtools"},
+    "quay.io/biocontainers/samtools-extra:2.0.json": {"extra": "/usr/bin/extra"},
+    "library/ubuntu:latest.json": {"bash": "/bin/bash", "ls": "/bin/ls"},
+}
+
+
+def write_tree(root):
+    for relpath, aliases in entries.items():
+        filename = os.path.join(root, relpath)
+        utils.mkdir_p(os.path.dirname(filename))
+        utils.write_json(aliases, filename)
+    utils.write_json({"bash": 1}, os.path.join(root, "counts.json"))
+
+
+def read_tree(root):
+    return {
+        os.path.relpath(x, root): utils.read_file(x)
+        for x in utils.find_files(root, ".json")
+    }
+
+
+def test_pack_round_trip(tmp_path):
+    root, exported = str(tmp_path / "cache"), str(tmp_path / "exported")
+    pack = str(tmp_path / "cache.db")
+    write_tree(root)
+    assert store.import_pack(root, pack) == len(entries)
+    assert store.export_pack(exported, pack) == len(entries)
+
+    # Entries (and not reserved files) are the same, byte for byte
+    original = read_tree(root)
+    del original["counts.json"]
+    assert read_tree(exported) == original
+
+
+def test_pack_lookups(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    store.import_pack(root, str(tmp_path / "cache.db"))
+    packed = store.PackedCache(str(tmp_path / "cache.db"), root)
+
+    prefix = os.path.join(root, "quay.io", "biocontainers", "samtools")
+    assert packed.has_prefix(prefix)
+    assert [os.path.basename(x) for x in packed.search_prefix(prefix)] == [
+        "samtools:1.0.json",
+        "samtools:1.1.json",
+    ]
+
+    # A prefix of another image's name is not a match
+    assert not packed.has_prefix(os.path.join(root, "quay.io", "biocontainers", "sam"))
+    assert packed.search_prefix(os.path.join(root, "library", "debian")) == []
+
+    filename = os.path.join(root, "library", "ubuntu:latest.json")
+    assert filename in packed
+    assert packed.read(filename) == entries["library/ubuntu:latest.json"]
+    assert len(packed) == len(entries)
+    packed.close()
+
+
+def test_cache_index_lookups(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    index = store.CacheIndex(root)
+
+    # Reserved files at the root are not indexed
+    assert len(index) == len(entries)
+
+    prefix = os.path.join(root, "quay.io", "biocontainers", "samtools")
+    assert index.has_prefix(prefix)
+    assert [os.path.basename(x) for x in index.search_prefix(prefix)] == [
+        "samtools:1.0.json",
+        "samtools:1.1.json",
+    ]
+
+    # Unlike a glob of <prefix>*.json, a prefix of another name is not a match
+    assert not index.has_prefix(os.path.join(root, "quay.io", "biocontainers", "sam"))
+    assert index.search_prefix(os.path.join(root, "library", "debian")) == []
+
+    filename = os.path.join(root, "library", "ubuntu:latest.json")
+    assert filename in index
+    assert index.read(filename) == entries["library/ubuntu:latest.json"]
+
+
+def test_cache_index_matches_pack(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    store.import_pack(root, str(tmp_path / "cache.db"))
+    packed = store.PackedCache(str(tmp_path / "cache.db"), root)
+    index = store.CacheIndex(root)
+    for relpath in ["quay.io/biocontainers/samtools", "library/ubuntu", "library/x"]:
+        prefix = os.path.join(root, relpath)
+        assert index.has_prefix(prefix) == packed.has_prefix(prefix)
+        assert index.search_prefix(prefix) == packed.search_prefix(prefix)
+    packed.close()
+
+
+def test_cache_index_write(tmp_path):
+    root = str(tmp_path / "cache")
+    utils.mkdir_p(root)
+    index = store.CacheIndex(root)
+    filename = os.path.join(root, "library", "debian:12.json")
+    assert not index.has_prefix(os.path.join(root, "library", "debian"))
+
+    index.write(filename, {"bash": "/bin/bash"})
+    assert filename in index
+    assert index.read(filename) == {"bash": "/bin/bash"}
+
+    # An entry written again is indexed once, and a new walk finds the same
+    index.write(filename, {"bash": "/usr/bin/bash"})
+    assert len(index) == 1
+    assert store.CacheIndex(root).entries == index.entries
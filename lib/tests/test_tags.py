@@ -0,0 +1,108 @@
+import os
+
+import requests
+
+import container_discovery.tags as tags
+
+
+class FailingSession:
+    def get(self, url, **kwargs):
+        raise requests.ConnectionError(f"Cannot connect to {url}")
+
+
+def test_request_errors_skip_only_the_image():
+    images = ["library/ubuntu", "library/debian"]
+    results = list(tags.iter_tags(images, workers=2, session=FailingSession()))
+    assert results == [(image, None) for image in images]
+
+
+class Response:
+    def __init__(self, text="", status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RecordingSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+def test_tag_cache_fresh_entry(tmp_path):
+    cache = tags.TagCache(str(tmp_path), ttl=60)
+    session = RecordingSession(Response("1.0\n2.0\n"))
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["1.0", "2.0"]
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["1.0", "2.0"]
+
+    # The second listing is from the cache, without a request
+    assert len(session.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_tag_cache_revalidates_stale_entry(tmp_path):
+    cache = tags.TagCache(str(tmp_path), ttl=0)
+    headers = {"ETag": '"abc"', "Last-Modified": "Mon, 12 Oct 2026 00:00:00 GMT"}
+    session = RecordingSession(
+        Response("1.0\n", headers=headers), Response(status_code=304)
+    )
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["1.0"]
+    fetched = cache.get("library/ubuntu")["fetched"]
+
+    # A stale entry is requested with its validators, and not modified
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["1.0"]
+    assert session.requests[1] == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 12 Oct 2026 00:00:00 GMT",
+    }
+
+    # The entry is good for another ttl, and keeps its validators
+    entry = cache.get("library/ubuntu")
+    assert entry["fetched"] >= fetched
+    assert entry["etag"] == '"abc"'
+    assert entry["last_modified"] == headers["Last-Modified"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_tag_cache_replaces_modified_entry(tmp_path):
+    cache = tags.TagCache(str(tmp_path), ttl=0)
+    session = RecordingSession(
+        Response("1.0\n", headers={"ETag": '"abc"'}),
+        Response("1.0\n2.0\n", headers={"ETag": '"def"'}),
+        Response("error", status_code=500),
+    )
+    tags.get_tags("library/ubuntu", session, cache=cache)
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["1.0", "2.0"]
+    assert cache.get("library/ubuntu")["etag"] == '"def"'
+
+    # An error response is not cached
+    tags.get_tags("library/ubuntu", session, cache=cache)
+    assert cache.get("library/ubuntu")["tags"] == ["1.0", "2.0"]
+
+
+def test_tag_cache_refresh_skips_validators(tmp_path):
+    cache = tags.TagCache(str(tmp_path), ttl=60)
+    cache.set("library/ubuntu", ["1.0"], Response(headers={"ETag": '"abc"'}))
+    cache.refresh = True
+    session = RecordingSession(Response("2.0\n"))
+    assert tags.get_tags("library/ubuntu", session, cache=cache) == ["2.0"]
+    assert session.requests == [{}]
+
+
+def test_tag_cache_prune_least_recently_used(tmp_path):
+    cache = tags.TagCache(str(tmp_path), max_entries=2)
+    images = ["library/ubuntu", "library/debian", "library/alpine"]
+    for i, image in enumerate(images):
+        cache.set(image, ["latest"])
+        os.utime(cache.get_path(image), (i, i))
+
+    # A hit makes ubuntu the most recently used
+    assert tags.get_tags("library/ubuntu", cache=cache) == ["latest"]
+    assert cache.prune() == 1
+    assert cache.get("library/debian") is None
+    assert cache.get("library/ubuntu") and cache.get("library/alpine")
+    assert cache.prune() == 0
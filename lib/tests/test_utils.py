@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+import container_discovery.utils as utils
+
+data = {
+    "samtools": "/usr/bin/samtools",
+    "unicode": "café ☃",
+    "counts": [0, 1, 2**40, -3],
+    "nested": {"empty": [], "none": None, "true": True},
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """
+    Run a test with orjson (if it is installed) and with the standard library.
+    """
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        monkeypatch.setattr(utils, "orjson", False)
+        assert utils.get_orjson() is not None
+    else:
+        monkeypatch.setattr(utils, "orjson", None)
+    return request.param
+
+
+def test_compact_json_is_the_same_bytes(backend):
+    expected = b'{"samtools":"/usr/bin/samtools","unicode":"caf\xc3\xa9 \xe2\x98\x83",'
+    assert utils.dump_json(data).startswith(expected)
+    assert utils.dump_json(data).endswith(
+        b'"nested":{"empty":[],"none":null,"true":true}}'
+    )
+    assert utils.print_json(data, compact=True) == utils.dump_json(data).decode("utf-8")
+
+
+def test_pretty_json_uses_the_standard_library(backend):
+    assert utils.print_json(data) == (
+        utils.print_json.__globals__["json"].dumps(
+            data, indent=4, separators=(",", ": ")
+        )
+    )
+
+
+def test_floats_round_trip(backend):
+    values = {"fetched": 1700000000.123456, "big": 1e20, "small": 1e-7}
+    assert utils.parse_json(utils.dump_json(values)) == values
+
+
+def test_large_integers_fall_back(backend):
+    assert utils.parse_json(utils.dump_json({"x": 2**70})) == {"x": 2**70}
+
+
+def test_write_and_read_json(backend, tmp_path):
+    for compact in [True, False]:
+        filename = str(tmp_path / f"data-{compact}.json")
+        utils.write_json(data, filename, compact=compact)
+        assert utils.read_json(filename) == data
+        assert utils.parse_json(utils.read_file(filename, "rb")) == data
+
+    # Nothing is left behind from writing through a temporary file
+    assert sorted(os.listdir(tmp_path)) == ["data-False.json", "data-True.json"]
+
+
+def write_tree(root):
+    for relpath in [
+        "library/ubuntu:latest.json",
+        "quay.io/biocontainers/s/samtools:1.0.json",
+        "quay.io/biocontainers/s/samtools:1.0.json.bak",
+        "quay.io/biocontainers/b/bwajson",
+        ".container-discovery/digests.json",
+        ".git/objects/pack.json",
+        "node_modules/x/package.json",
+        "library/__pycache__/cached.json",
+        "counts.json",
+    ]:
+        filename = os.path.join(root, relpath)
+        utils.mkdir_p(os.path.dirname(filename))
+        utils.write_file("{}", filename)
+
+
+def test_find_files(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    expected = [
+        "counts.json",
+        "library/ubuntu:latest.json",
+        "quay.io/biocontainers/s/samtools:1.0.json",
+    ]
+
+    # The suffix is literal, and hidden or skipped directories are not searched
+    assert sorted(utils.find_files(root, ".json", absolute=False)) == expected
+    assert sorted(utils.find_files(root, ".json")) == [
+        os.path.join(root, x) for x in expected
+    ]
+
+    # The same files as a recursive find, without the pruned directories
+    found = [
+        x
+        for x in utils.recursive_find(root, r"\.json$")
+        if "__pycache__" not in x and "node_modules" not in x
+    ]
+    assert sorted(utils.find_files(root)) == sorted(found)
+
+
+def test_find_files_workers(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    for i in range(20):
+        filename = os.path.join(root, f"r{i % 5}", f"image{i}:1.json")
+        utils.mkdir_p(os.path.dirname(filename))
+        utils.write_file("{}", filename)
+    assert list(utils.find_files(root, workers=4)) == list(utils.find_files(root))
+
+
+def test_find_files_links(tmp_path):
+    root = str(tmp_path / "cache")
+    write_tree(root)
+    os.symlink(os.path.join(root, "library"), os.path.join(root, "linked"))
+    os.symlink(
+        os.path.join(root, "library", "ubuntu:latest.json"),
+        os.path.join(root, "ubuntu:linked.json"),
+    )
+
+    # Links to directories are not followed (as in os.walk), links to files are
+    found = sorted(utils.find_files(root, absolute=False))
+    assert "ubuntu:linked.json" in found
+    assert not any(x.startswith("linked") for x in found)
+
+
+def test_find_files_missing_base(tmp_path):
+    assert list(utils.find_files(str(tmp_path / "missing"))) == []
+    assert list(utils.recursive_find(str(tmp_path / "missing"))) == []
+
+
+def test_read_lines_drops_torn_line(tmp_path):
+    filename = str(tmp_path / "journal")
+    utils.write_file("library/a\nlibrary/b\nlibr", filename)
+    assert utils.read_lines(filename) == ["library/a", "library/b"]
+
+    # The torn line is truncated, so the next append is a whole line
+    with open(filename, "a") as fd:
+        fd.write("library/c\n")
+    assert utils.read_lines(filename) == ["library/a", "library/b", "library/c"]